@@ -1,26 +1,63 @@
-import os
-from fastapi import FastAPI, HTTPException, Depends
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from passlib.context import CryptContext
+from pydantic import BaseModel, Field
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
-# App and security setup
-app = FastAPI()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+import config
+
+# Router and security setup
+router = APIRouter()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=config.AUTH_ENABLED)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-SECRET_KEY = os.getenv("SECRET_KEY")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
-ALGORITHM = os.getenv("ALGORITHM")
+SECRET_KEY = config.SECRET_KEY
+ACCESS_TOKEN_EXPIRE_MINUTES = config.ACCESS_TOKEN_EXPIRE_MINUTES
+ALGORITHM = config.ALGORITHM
+
+# bcrypt is deliberately slow; keep it off the event loop and bound its concurrency
+_hash_executor = ThreadPoolExecutor(max_workers=config.AUTH_HASH_WORKERS, thread_name_prefix="bcrypt")
 
-# Example user database
+# Example user database; the hash of "testpassword" is precomputed so importing this module costs no bcrypt round
 fake_users_db = {
     "testuser": {
         "username": "testuser",
-        "hashed_password": pwd_context.hash("testpassword"),
+        "hashed_password": "$2b$12$LrYnBFmysXK2iyhl8cLWu.r7G.jLGqrtdNy/xJi28SdU4UPCes1hS",
     }
 }
 
+
+class TokenCache:
+    """LRU cache of decoded, validated JWT payloads, each kept until its ``exp``."""
+
+    def __init__(self, max_size=config.AUTH_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, token):
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if expires_at <= datetime.now(timezone.utc).timestamp():
+            del self._entries[token]
+            return None
+        self._entries.move_to_end(token)
+        return payload
+
+    def put(self, token, payload):
+        self._entries[token] = (payload, payload["exp"])
+        self._entries.move_to_end(token)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+token_cache = TokenCache()
+
+
 # Utility functions
 def get_password_hash(password):
     return pwd_context.hash(password)
@@ -28,42 +65,68 @@ def get_password_hash(password):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def run_in_hash_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+
 def create_access_token(data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
-    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    expire = datetime.now(timezone.utc) + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def authenticate_user(username: str, password: str):
+async def authenticate_user(username: str, password: str):
     user = fake_users_db.get(username)
-    if user and verify_password(password, user["hashed_password"]):
+    if user and await run_in_hash_pool(verify_password, password, user["hashed_password"]):
         return user
     return None
 
+def decode_token(token: str):
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None or "exp" not in payload:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    token_cache.put(token, payload)
+    return payload
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    """Dependency guarding the API routes; a no-op when ``AUTH_ENABLED`` is off."""
+    if not config.AUTH_ENABLED:
+        return None
+    return decode_token(token)["sub"]
+
 # Routes
-@app.post("/token")
+@router.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     access_token = create_access_token(data={"sub": user["username"]})
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/users/me")
-async def read_users_me(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return {"username": username}
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+@router.get("/users/me")
+async def read_users_me(username: str = Depends(get_current_user)):
+    return {"username": username}
+
+class UserRegistration(BaseModel):
+    username: str = Field(..., min_length=1)
+    password: str = Field(..., min_length=8)
 
-# User registration (optional example)
-@app.post("/register")
-async def register_user(username: str, password: str):
+
+# User registration: off unless AUTH_REGISTRATION_ENABLED, and only for callers already holding a token
+@router.post("/register")
+async def register_user(data: UserRegistration, _: str = Depends(get_current_user)):
+    if not config.AUTH_REGISTRATION_ENABLED:
+        raise HTTPException(status_code=403, detail="Registration is disabled")
+    username, password = data.username, data.password
+    if username in fake_users_db:
+        raise HTTPException(status_code=400, detail="User already exists")
+    hashed_password = await run_in_hash_pool(get_password_hash, password)
     if username in fake_users_db:
         raise HTTPException(status_code=400, detail="User already exists")
-    fake_users_db[username] = {"username": username, "hashed_password": get_password_hash(password)}
-    return {"message": f"User {username} registered successfully"}
\ No newline at end of file
+    fake_users_db[username] = {"username": username, "hashed_password": hashed_password}
+    return {"message": f"User {username} registered successfully"}
@@ -0,0 +1,199 @@
+"""Offline benchmark of the API against a synthetic book.
+
+Builds a book in SQLite (default) or a local Postgres, replaces yfinance
+with a deterministic price feed and drives the FastAPI app in-process::
+
+    python -m benchmarks.run --clients 5000 --output results.json
+    python -m benchmarks.run --clients 5000 --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+from tortoise import Tortoise
+
+
+def _percentiles(latencies):
+    p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99]) if latencies else (0, 0, 0)
+    return round(float(p50), 3), round(float(p95), 3), round(float(p99), 3)
+
+
+async def run_endpoint(client, make_request, requests, concurrency):
+    """Issue ``requests`` calls with at most ``concurrency`` in flight."""
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            method, url, body = make_request(i)
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    p50, p95, p99 = _percentiles(latencies)
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+    }
+
+
+def scenarios(names, seed):
+    rng = random.Random(seed)
+
+    def margin(i):
+        return "GET", f"/margin/{rng.choice(names)}", None
+
+    def transfer(i):
+        sender, recipient = rng.sample(names, 2)
+        return "POST", "/transfers", {"sender": sender, "recipient": recipient, "amount": 1.0}
+
+    def stocks(i):
+        return "GET", "/stocks?limit=500", None
+
+    def accounts(i):
+        return "GET", f"/accounts/{rng.choice(names)}", None
+
+    def accounts_list(i):
+        return "GET", "/accounts", None
+
+    return {
+        "/margin/{name}": margin,
+        "/transfers": transfer,
+        "/stocks": stocks,
+        "/accounts/{name}": accounts,
+        "/accounts": accounts_list,
+    }
+
+
+def measure_cold_start(runs):
+    """Wall time of fresh interpreters importing the app, as a new worker would."""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], check=True)
+        timings.append(time.perf_counter() - started)
+    p50, p95, _ = _percentiles(timings)
+    return {"runs": runs, "p50_ms": p50, "p95_ms": p95}
+
+
+def compare(results, baseline):
+    print(f"\n{'endpoint':<18} {'metric':<15} {'baseline':>12} {'current':>12} {'change':>9}")
+    for endpoint, current in results["results"].items():
+        previous = baseline.get("results", {}).get(endpoint)
+        if previous is None:
+            continue
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            before, after = previous[metric], current[metric]
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"{endpoint:<18} {metric:<15} {before:>12} {after:>12} {change:>9}")
+    if results.get("cold_start") and baseline.get("cold_start"):
+        for metric in ("p50_ms", "p95_ms"):
+            before, after = baseline["cold_start"][metric], results["cold_start"][metric]
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"{'cold start':<18} {metric:<15} {before:>12} {after:>12} {change:>9}")
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+async def main(args):
+    # Tokens are minted locally, any key will do
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    from auth import create_access_token
+    from benchmarks.synthetic_book import FakePriceSource, generate_book
+    from db_config import apply_migrations, tortoise_config
+    import main as api
+    from utils.metrics.instrumentation import instrument_db_clients
+    from utils.yfinance.quote_fetcher import QuoteFetcher
+
+    cold_start = None
+    if args.cold_start_runs:
+        cold_start = measure_cold_start(args.cold_start_runs)
+        print(f"{'cold start':<18} p50 {cold_start['p50_ms']:>8} ms  p95 {cold_start['p95_ms']:>8} ms")
+
+    await Tortoise.init(config=tortoise_config(args.db_url, args.read_db_url))
+    instrument_db_clients()
+    await apply_migrations()
+    try:
+        started = time.perf_counter()
+        price_source = FakePriceSource(args.seed)
+        names, _ = await generate_book(args.clients, args.positions_per_client, args.symbols,
+                                       args.ticks_per_symbol, args.seed, price_source)
+        print(f"Generated book in {time.perf_counter() - started:.1f}s")
+
+        # Never reach out to Yahoo Finance from a benchmark
+        api.quote_fetcher = QuoteFetcher(fetch=price_source.intraday_bars)
+        api.ingestion_scheduler.source = price_source
+
+        endpoints = scenarios(names, args.seed)
+        selected = args.endpoints or list(endpoints)
+        results = {}
+        transport = httpx.ASGITransport(app=api.app)
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': 'benchmark'})}"}
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", headers=headers) as client:
+            for endpoint in selected:
+                results[endpoint] = await run_endpoint(client, endpoints[endpoint], args.requests, args.concurrency)
+                r = results[endpoint]
+                print(f"{endpoint:<18} {r['throughput_rps']:>9} req/s  p50 {r['p50_ms']:>8} ms  "
+                      f"p95 {r['p95_ms']:>8} ms  p99 {r['p99_ms']:>8} ms  errors {r['errors']}")
+    finally:
+        await Tortoise.close_connections()
+
+    output = {
+        "revision": _git_revision(),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "cold_start": cold_start,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"Saved results to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(output, json.load(f))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the API against a synthetic book.")
+    parser.add_argument("--db-url", default=os.getenv("BENCHMARK_DATABASE_URL", "sqlite://:memory:"),
+                        help="use an empty, disposable database: the book is inserted into it")
+    parser.add_argument("--read-db-url", default=os.getenv("BENCHMARK_DATABASE_READ_URL", ""),
+                        help="route read-only endpoints here, e.g. a replica of --db-url or the same SQLite file")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--positions-per-client", type=int, default=10)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--ticks-per-symbol", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cold-start-runs", type=int, default=5, help="fresh interpreters importing the app; 0 skips")
+    parser.add_argument("--endpoints", nargs="*", help="subset of endpoints to run")
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare against saved results")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,107 @@
+# Deterministic synthetic book and offline price feed for benchmarks
+import datetime
+import zlib
+
+import numpy as np
+
+from models import Client, Margin, MarketData, Position
+from utils.money.fixed_point import from_micros, to_micros, to_micros_array
+
+INSERT_BATCH_SIZE = 5000
+
+
+def _base_price(symbol):
+    return 10.0 + zlib.crc32(symbol.encode()) % 49000 / 100.0
+
+
+class FakePriceSource:
+    """Deterministic random-walk prices usable in place of ``yfinance``.
+
+    ``fetch`` matches the ingestion scheduler's price source interface and
+    ``intraday_bars`` matches the ``QuoteFetcher`` fetch callable; each call
+    returns one new flat bar per symbol, priced in micro-units.
+    """
+
+    def __init__(self, seed=0, volatility=0.002, start=None):
+        self.seed = seed
+        self.volatility = volatility
+        self.start = start or datetime.datetime(2025, 1, 2, 14, 30, tzinfo=datetime.timezone.utc)
+        self._steps = {}
+
+    def price_path(self, symbol, steps):
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        returns = rng.normal(0.0, self.volatility, steps)
+        return to_micros_array(np.round(_base_price(symbol) * np.exp(np.cumsum(returns)), 3))
+
+    def _next(self, symbol):
+        step = self._steps.get(symbol, 0) + 1
+        self._steps[symbol] = step
+        timestamp = self.start + datetime.timedelta(minutes=step)
+        price = int(self.price_path(symbol, step)[-1])
+        return [(timestamp, price, price, price, price, 0)]
+
+    def fetch(self, symbols):
+        return {symbol: self._next(symbol) for symbol in symbols}
+
+    def intraday_bars(self, symbol):
+        return self._next(symbol)
+
+
+def symbol_universe(count):
+    return [f"SYM{i:04d}" for i in range(count)]
+
+
+async def _bulk_insert(model, rows):
+    for i in range(0, len(rows), INSERT_BATCH_SIZE):
+        await model.bulk_create(rows[i:i + INSERT_BATCH_SIZE])
+
+
+async def generate_book(clients=1000, positions_per_client=10, symbols=200, ticks_per_symbol=100, seed=0,
+                        price_source=None):
+    """Populate the database with a reproducible book and tick history.
+
+    Loans are drawn so that roughly a tenth of accounts are in a margin call
+    at the last generated price. Returns the client names and symbols.
+    """
+    rng = np.random.default_rng(seed)
+    price_source = price_source or FakePriceSource(seed)
+    universe = symbol_universe(symbols)
+
+    ticks = []
+    last_prices = {}
+    for symbol in universe:
+        path = price_source.price_path(symbol, ticks_per_symbol)
+        last_prices[symbol] = int(path[-1])
+        ticks.extend(
+            MarketData(symbol=symbol, current_price=int(price),
+                       timestamp=price_source.start + datetime.timedelta(minutes=step))
+            for step, price in enumerate(path, start=1)
+        )
+    await _bulk_insert(MarketData, ticks)
+    # Live quotes continue the stored history
+    price_source._steps = {symbol: ticks_per_symbol for symbol in universe}
+
+    names = [f"BENCH{i:07d}" for i in range(clients)]
+    await _bulk_insert(Client, [
+        Client(name=name, balance=to_micros(float(balance)))
+        for name, balance in zip(names, np.round(rng.uniform(10_000, 1_000_000, clients), 2))
+    ])
+    client_ids = dict(await Client.filter(name__in=names).values_list("name", "id"))
+
+    positions, margins = [], []
+    per_client = min(positions_per_client, symbols)
+    for name in names:
+        held = rng.choice(symbols, per_client, replace=False)
+        quantities = rng.integers(1, 500, per_client)
+        value = 0
+        for j, quantity in zip(held, quantities):
+            symbol = universe[j]
+            value += int(quantity) * last_prices[symbol]
+            positions.append(Position(client_id=client_ids[name], symbol=symbol, quantity=int(quantity),
+                                      cost_basis=to_micros(round(from_micros(last_prices[symbol]) * rng.uniform(0.8, 1.2), 3))))
+        # With MMR = 0.25 a loan above 75% of value is a margin call
+        loan = from_micros(value) * rng.uniform(0.2, 0.82)
+        margins.append(Margin(client_id=client_ids[name], loan=to_micros(round(loan, 2)), margin_requirement=0))
+    await _bulk_insert(Position, positions)
+    await _bulk_insert(Margin, margins)
+    return names, universe
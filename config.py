@@ -5,4 +5,120 @@ from dotenv import load_dotenv
 load_dotenv(".env.local")
 
 MMR = 0.25
+# Largest amount one deposit, withdrawal, transfer or opening balance may carry, in dollars.
+# Balances are BIGINT micro-units (at most about 9.2e12 dollars); the default keeps even a full
+# transfer batch well inside that.
+MAX_TRANSACTION_AMOUNT = float(os.getenv("MAX_TRANSACTION_AMOUNT", "100000000"))
 DATABASE_URL = os.getenv("DATABASE_URL")
+# Optional read replica for read-only endpoints; empty sends every query to DATABASE_URL
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+
+# Postgres connection pools and asyncpg statement caching, unless set in the URL's query string.
+# Use DB_STATEMENT_CACHE_SIZE=0 behind a transaction-pooling PgBouncer.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_READ_POOL_MAX_SIZE = int(os.getenv("DB_READ_POOL_MAX_SIZE", "20"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+
+# Schema migrations normally run once per deploy with `python migrate.py`; workers only check the version.
+# Enable for local development to apply pending migrations at startup.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+# Authentication (see auth.py)
+AUTH_ENABLED = os.getenv("AUTH_ENABLED", "true").lower() in ("1", "true", "yes")
+SECRET_KEY = os.getenv("SECRET_KEY")
+ALGORITHM = os.getenv("ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# POST /register creates users; when enabled it still requires a valid bearer token
+AUTH_REGISTRATION_ENABLED = os.getenv("AUTH_REGISTRATION_ENABLED", "false").lower() in ("1", "true", "yes")
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", "2"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+# Latest-price cache used by fetch_latest_price
+PRICE_CACHE_TTL_SECONDS = float(os.getenv("PRICE_CACHE_TTL_SECONDS", "30"))
+PRICE_CACHE_MAX_SIZE = int(os.getenv("PRICE_CACHE_MAX_SIZE", "10000"))
+
+# Latest-price table shared by all worker processes through a memory-mapped file, e.g.
+# /dev/shm/risk-system-prices; empty keeps each worker's cache private
+SHARED_PRICE_TABLE_PATH = os.getenv("SHARED_PRICE_TABLE_PATH", "")
+SHARED_PRICE_TABLE_SLOTS = int(os.getenv("SHARED_PRICE_TABLE_SLOTS", "16384"))
+
+# Per-account snapshot cache (balance, positions, loan); every hit is checked against the
+# account's version in the database, so writes made by other workers are seen at once
+ACCOUNT_CACHE_TTL_SECONDS = float(os.getenv("ACCOUNT_CACHE_TTL_SECONDS", "30"))
+ACCOUNT_CACHE_MAX_SIZE = int(os.getenv("ACCOUNT_CACHE_MAX_SIZE", "10000"))
+
+# Background price ingestion for held symbols (0 disables the scheduler)
+PRICE_INGESTION_INTERVAL_SECONDS = float(os.getenv("PRICE_INGESTION_INTERVAL_SECONDS", "60"))
+
+# Live quote fetches from yfinance in GET /stocks/{symbol}
+YFINANCE_MAX_WORKERS = int(os.getenv("YFINANCE_MAX_WORKERS", "8"))
+YFINANCE_TIMEOUT_SECONDS = float(os.getenv("YFINANCE_TIMEOUT_SECONDS", "5"))
+YFINANCE_BREAKER_FAILURES = int(os.getenv("YFINANCE_BREAKER_FAILURES", "3"))
+YFINANCE_BREAKER_RESET_SECONDS = float(os.getenv("YFINANCE_BREAKER_RESET_SECONDS", "60"))
+
+# MarketData retention (raw ticks) and OHLC rollups
+MARKET_DATA_RETENTION_DAYS = float(os.getenv("MARKET_DATA_RETENTION_DAYS", "30"))
+ROLLUP_1M_RETENTION_DAYS = float(os.getenv("ROLLUP_1M_RETENTION_DAYS", "365"))
+MARKET_DATA_PRUNE_BATCH_SIZE = int(os.getenv("MARKET_DATA_PRUNE_BATCH_SIZE", "10000"))
+MARKET_DATA_PRUNE_INTERVAL_SECONDS = float(os.getenv("MARKET_DATA_PRUNE_INTERVAL_SECONDS", "3600"))
+
+# One-minute OHLCV bars kept from quote and ingestion downloads
+PRICE_BARS_RETENTION_DAYS = float(os.getenv("PRICE_BARS_RETENTION_DAYS", "90"))
+PRICE_BARS_UPSERT_BATCH_SIZE = int(os.getenv("PRICE_BARS_UPSERT_BATCH_SIZE", "1000"))
+
+# GET /stocks pagination and streaming export
+STOCKS_PAGE_SIZE = int(os.getenv("STOCKS_PAGE_SIZE", "500"))
+STOCKS_MAX_PAGE_SIZE = int(os.getenv("STOCKS_MAX_PAGE_SIZE", "5000"))
+STOCKS_EXPORT_CHUNK_SIZE = int(os.getenv("STOCKS_EXPORT_CHUNK_SIZE", "5000"))
+
+# POST /transfers/batch
+TRANSFER_BATCH_MAX_SIZE = int(os.getenv("TRANSFER_BATCH_MAX_SIZE", "10000"))
+
+# Bulk imports (POST /imports/{kind})
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_MAX_BATCH_SIZE = int(os.getenv("IMPORT_MAX_BATCH_SIZE", "50000"))
+
+# Margin requirement: "flat" applies MMR to every position; "volatility" and "var" derive a per-symbol
+# rate from the stored one-minute bars, never below MMR, recomputed once per RISK_WINDOW_MINUTES
+MARGIN_MODE = os.getenv("MARGIN_MODE", "flat").lower()
+RISK_LOOKBACK_DAYS = float(os.getenv("RISK_LOOKBACK_DAYS", "5"))
+RISK_MIN_BARS = int(os.getenv("RISK_MIN_BARS", "100"))
+RISK_HORIZON_MINUTES = float(os.getenv("RISK_HORIZON_MINUTES", "390"))  # One trading day
+RISK_VOLATILITY_MULTIPLIER = float(os.getenv("RISK_VOLATILITY_MULTIPLIER", "3"))
+RISK_VAR_CONFIDENCE = float(os.getenv("RISK_VAR_CONFIDENCE", "0.99"))
+RISK_WINDOW_MINUTES = float(os.getenv("RISK_WINDOW_MINUTES", "60"))
+
+# Incremental margin monitoring and margin-call events
+MARGIN_MONITOR_REBUILD_SECONDS = float(os.getenv("MARGIN_MONITOR_REBUILD_SECONDS", "300"))
+MARGIN_EVENTS_QUEUE_SIZE = int(os.getenv("MARGIN_EVENTS_QUEUE_SIZE", "1000"))
+MARGIN_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("MARGIN_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Write-behind margin history: GET /margin/{name} results are queued and appended to MarginSnapshot
+# in batches (0 disables the history)
+MARGIN_HISTORY_FLUSH_SECONDS = float(os.getenv("MARGIN_HISTORY_FLUSH_SECONDS", "5"))
+MARGIN_HISTORY_BATCH_SIZE = int(os.getenv("MARGIN_HISTORY_BATCH_SIZE", "1000"))
+MARGIN_HISTORY_QUEUE_SIZE = int(os.getenv("MARGIN_HISTORY_QUEUE_SIZE", "100000"))
+
+# POST /stress
+STRESS_MAX_SCENARIOS = int(os.getenv("STRESS_MAX_SCENARIOS", "1000"))
+STRESS_MAX_ACCOUNTS_PER_SCENARIO = int(os.getenv("STRESS_MAX_ACCOUNTS_PER_SCENARIO", "100"))
+
+# Argument/result capture in log_function (off by default; latency is always recorded)
+LOG_FUNCTION_CAPTURE = os.getenv("LOG_FUNCTION_CAPTURE", "false").lower() in ("1", "true", "yes")
+LOG_FUNCTION_SAMPLE_RATE = float(os.getenv("LOG_FUNCTION_SAMPLE_RATE", "0.01"))
+LOG_FUNCTION_MAX_CHARS = int(os.getenv("LOG_FUNCTION_MAX_CHARS", "500"))
+
+# Logging pipeline: records are queued and written in batches by a worker thread
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_FILE = os.getenv("LOG_FILE")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "500"))
+# Comma-separated logger=value pairs; a setting applies to the logger and its children
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "utils.logging.logging_decorator.get_stock_data=0.1")
+LOG_RATE_LIMITS = os.getenv(
+    "LOG_RATE_LIMITS",
+    "utils.logging.logging_decorator.get_stock_data=20,utils.yfinance.quote_fetcher=20",
+)
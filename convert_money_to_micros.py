@@ -0,0 +1,60 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from config import DATABASE_URL
+
+# (table, column) pairs that moved from float dollars to BIGINT micro-units
+MONEY_COLUMNS = [
+    ("client", "balance"),
+    ("position", "cost_basis"),
+    ("marketdata", "current_price"),
+    ("marketdatarollup", "open"),
+    ("marketdatarollup", "high"),
+    ("marketdatarollup", "low"),
+    ("marketdatarollup", "close"),
+    ("margin", "margin_requirement"),
+    ("margin", "loan"),
+]
+
+
+def conversion_statements():
+    """One ``ALTER TABLE`` per table, rewriting each float column as rounded micro-units."""
+    tables = {}
+    for table, column in MONEY_COLUMNS:
+        tables.setdefault(table, []).append(
+            f'ALTER COLUMN "{column}" TYPE BIGINT USING round("{column}"::numeric * 1000000)::bigint'
+        )
+    return [f'ALTER TABLE "{table}" {", ".join(clauses)}' for table, clauses in tables.items()]
+
+
+async def convert(db_url: str, dry_run: bool):
+    statements = conversion_statements()
+    if dry_run:
+        for statement in statements:
+            print(statement + ";")
+        return
+    await Tortoise.init(db_url=db_url, modules={"models": ["models"]})
+    try:
+        async with in_transaction() as transaction:
+            for statement in statements:
+                await transaction.execute_script(statement)
+                print(f"  ✓ {statement}")
+    finally:
+        await Tortoise.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert an existing Postgres database from float dollars to integer micro-units. Run once."
+    )
+    parser.add_argument("--db-url", default=DATABASE_URL)
+    parser.add_argument("--dry-run", action="store_true", help="Print the SQL instead of running it")
+    args = parser.parse_args()
+    asyncio.run(convert(args.db_url, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,112 @@
-from tortoise import Tortoise
-import asyncio
+import importlib
+import logging
+from pathlib import Path
 
-from config import DATABASE_URL
-# Database connection URL
+from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
+from tortoise.exceptions import OperationalError
+from tortoise.transactions import in_transaction
 
-async def init_db():
-    await Tortoise.init(
-        db_url=DATABASE_URL,
-        modules={'models': ['models']}
+import config
+
+logger = logging.getLogger(__name__)
+
+POOLED_ENGINES = ("tortoise.backends.asyncpg", "tortoise.backends.psycopg")
+
+
+def _connection(db_url: str, max_size: int):
+    connection = expand_db_url(db_url)
+    if connection["engine"] in POOLED_ENGINES:
+        credentials = connection["credentials"]
+        credentials.setdefault("minsize", config.DB_POOL_MIN_SIZE)
+        credentials.setdefault("maxsize", max_size)
+        if connection["engine"] == "tortoise.backends.asyncpg":
+            credentials.setdefault("max_inactive_connection_lifetime", config.DB_MAX_INACTIVE_CONNECTION_LIFETIME)
+            credentials.setdefault("statement_cache_size", config.DB_STATEMENT_CACHE_SIZE)
+        else:
+            # psycopg_pool names the idle timeout max_idle and rejects asyncpg's keyword
+            credentials.setdefault("max_idle", config.DB_MAX_INACTIVE_CONNECTION_LIFETIME)
+    return connection
+
+
+def tortoise_config(db_url: str = None, read_url: str = None):
+    """Tortoise config with a ``default`` primary and, when configured, a ``read`` replica."""
+    db_url = db_url or config.DATABASE_URL
+    read_url = config.DATABASE_READ_URL if read_url is None else read_url
+    db_connections = {"default": _connection(db_url, config.DB_POOL_MAX_SIZE)}
+    if read_url:
+        db_connections["read"] = _connection(read_url, config.DB_READ_POOL_MAX_SIZE)
+    return {
+        "connections": db_connections,
+        "apps": {"models": {"models": ["models"], "default_connection": "default"}},
+    }
+
+
+def read_db():
+    """Connection for read-only queries: the replica when configured, else None (the primary).
+
+    Pass it to ``QuerySet.using_db``. Writes, and reads that must see this
+    process's own writes, stay on the primary.
+    """
+    return connections.get("read") if "read" in connections.db_config else None
+
+
+# Versioned schema migrations: migrations/NNNN_name.py modules, each with an UPGRADE dict of
+# statements per dialect. They run on the primary only; a replica receives them by replication.
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATIONS_TABLE = "schema_migrations"
+# Serializes concurrent migrate runs on Postgres, e.g. several pods starting at once
+MIGRATIONS_LOCK_ID = 72_310_418
+
+
+def available_migrations():
+    """``(version, module name)`` of every migration file, oldest first."""
+    return sorted((path.stem.split("_", 1)[0], path.stem) for path in MIGRATIONS_DIR.glob("[0-9][0-9][0-9][0-9]_*.py"))
+
+
+async def applied_migrations(db=None):
+    db = db or connections.get("default")
+    try:
+        _, rows = await db.execute_query(f'SELECT "version" FROM "{MIGRATIONS_TABLE}"')
+    except OperationalError:
+        return set()
+    return {row["version"] for row in rows}
+
+
+async def pending_migrations(db=None):
+    applied = await applied_migrations(db)
+    return [(version, name) for version, name in available_migrations() if version not in applied]
+
+
+async def apply_migrations():
+    """Apply every pending migration, each in its own transaction; returns the names applied."""
+    db = connections.get("default")
+    dialect = db.capabilities.dialect
+    await db.execute_script(
+        f'CREATE TABLE IF NOT EXISTS "{MIGRATIONS_TABLE}" ('
+        '"version" VARCHAR(16) NOT NULL PRIMARY KEY, "name" VARCHAR(255) NOT NULL, '
+        '"applied_at" TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)'
     )
-    await Tortoise.generate_schemas()
\ No newline at end of file
+    applied = []
+    for version, name in await pending_migrations(db):
+        async with in_transaction("default") as transaction:
+            if dialect == "postgres":
+                await transaction.execute_query(f"SELECT pg_advisory_xact_lock({MIGRATIONS_LOCK_ID})")
+            # Another process may have applied it while this one waited for the lock
+            if version in await applied_migrations(transaction):
+                continue
+            module = importlib.import_module(f"migrations.{name}")
+            for statement in module.UPGRADE[dialect]:
+                await transaction.execute_query(statement)
+            await transaction.execute_query(
+                f'INSERT INTO "{MIGRATIONS_TABLE}" ("version", "name") VALUES (\'{version}\', \'{name}\')'
+            )
+        logger.info("Applied migration %s", name)
+        applied.append(name)
+    return applied
+
+
+async def init_db():
+    """Connect and bring the schema up to date, for one-off scripts such as insert_data.py."""
+    await Tortoise.init(config=tortoise_config())
+    await apply_migrations()
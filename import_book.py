@@ -0,0 +1,73 @@
+import argparse
+import asyncio
+import getpass
+import os
+
+import httpx
+
+BASE_URL = "http://localhost:8000"
+READ_SIZE = 1 << 16
+
+
+async def read_file(path):
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            yield chunk
+
+
+async def login(client, username: str, password: str):
+    """Exchange credentials for a bearer token at POST /token, or None if they are rejected."""
+    r = await client.post("/token", data={"username": username, "password": password})
+    if r.status_code != 200:
+        print(f"  ✗ login as {username}: {r.status_code} {r.text}")
+        return None
+    return r.json()["access_token"]
+
+
+async def import_book(kind: str, path: str, fmt: str, batch_size: int, base_url: str,
+                      token: str = None, username: str = None):
+    """Stream a CSV or NDJSON file to POST /imports/{kind} and print per-chunk progress."""
+    content_type = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        if token is None and username:
+            password = os.getenv("API_PASSWORD") or getpass.getpass(f"Password for {username}: ")
+            token = await login(client, username, password)
+            if token is None:
+                return
+        headers = {"Content-Type": content_type}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        r = await client.post(
+            f"/imports/{kind}",
+            params={"format": fmt, "batch_size": batch_size},
+            headers=headers,
+            content=read_file(path),
+        )
+    if r.status_code != 200:
+        print(f"  ✗ {r.status_code} {r.text}")
+        return
+    result = r.json()
+    for chunk in result["chunks"]:
+        print(f"  chunk {chunk['chunk']}: {chunk['imported']}/{chunk['rows']} rows, {chunk['error_count']} errors")
+        for error in chunk["errors"]:
+            print(f"    line {error['line']}: {error['error']}")
+    print(f"  ✓ {result['imported']} {kind} imported, {result['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import clients, positions or margin loans.")
+    parser.add_argument("kind", choices=["clients", "positions", "margins"])
+    parser.add_argument("path", help="CSV or NDJSON file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--token", default=os.getenv("API_TOKEN"), help="bearer token (default: $API_TOKEN)")
+    parser.add_argument("--username", default=os.getenv("API_USERNAME"),
+                        help="log in via /token instead; password from $API_PASSWORD or a prompt")
+    args = parser.parse_args()
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    asyncio.run(import_book(args.kind, args.path, fmt, args.batch_size, args.base_url, args.token, args.username))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,124 @@
+# Taken before any other import so the "import" phase of app_startup_seconds covers them all
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from collections import defaultdict
 from contextlib import asynccontextmanager
-from decimal import ROUND_UP, Decimal
+from datetime import datetime
+import json
+from typing import Annotated, Optional
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from tortoise import Tortoise
-from yfinance import Ticker
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
 
+from auth import get_current_user, router as auth_router
 import config
-from models import Client, Margin, MarketData
+from db_config import apply_migrations, pending_migrations, read_db, tortoise_config
+from models import Client, MarginSnapshot, MarketData, MarketDataRollup
+from utils.accounts.account_cache import account_cache
+from utils.imports.book_import import IMPORTERS, import_stream
+from utils.logging.async_logging import configure_logging, shutdown_logging
 from utils.logging.logging_decorator import log_function
+from utils.margin.margin_engine import get_all_margin_status
+from utils.margin.margin_history import MarginHistoryWriter
+from utils.margin.margin_monitor import MarginMonitor
+from utils.margin.risk_model import margin_rates
+from utils.margin.stress_engine import run_stress_test
+from utils.market_data.bars import price_bar_writer
+from utils.market_data.export import decode_cursor, encode_cursor, fetch_page, market_data_query, stream_csv, stream_ndjson
+from utils.market_data.timeseries import ROLLUP_INTERVALS, MarketDataRetention
+from utils.metrics.instrumentation import MetricsMiddleware, instrument_db_clients
+from utils.metrics.metrics import GaugeCallback, render as render_metrics
+from utils.money.fixed_point import from_micros, rate_products_to_micros, to_micros
+from utils.yfinance.price_cache import price_cache
+from utils.yfinance.price_ingestion import PriceIngestionScheduler, YFinancePriceSource, store_ticks
+from utils.yfinance.quote_fetcher import QuoteFetcher
 from utils.yfinance.yfinance_stock_utils import fetch_latest_price
 import logging
 import os
 
 load_dotenv(".env.local")
+logger = logging.getLogger(__name__)
 app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+# Every API route requires a valid bearer token; /token and /metrics stay public, /register needs one too
+api = APIRouter(dependencies=[Depends(get_current_user)])
+ingestion_scheduler = PriceIngestionScheduler(YFinancePriceSource())
+quote_fetcher = QuoteFetcher()
+market_data_retention = MarketDataRetention()
+margin_monitor = MarginMonitor()
+margin_history = MarginHistoryWriter()
+ingestion_scheduler.listeners.append(margin_monitor.on_ticks)
+
+
+startup_timings = {"import": time.perf_counter() - IMPORT_STARTED}
 
 
 @app.on_event("startup")
 async def startup_event():
-    await Tortoise.init(
-        db_url=config.DATABASE_URL,
-        modules={"models": ["models"]},
-    )
-    await Tortoise.generate_schemas()
+    started = time.perf_counter()
+    configure_logging()
+    await Tortoise.init(config=tortoise_config())
+    instrument_db_clients()
+    if config.DB_MIGRATE_ON_STARTUP:
+        await apply_migrations()
+    else:
+        pending = await pending_migrations()
+        if pending:
+            logger.warning("Database schema is %s migrations behind (%s); run `python migrate.py`",
+                           len(pending), ", ".join(name for _, name in pending))
+    margin_monitor.start()
+    margin_history.start()
+    ingestion_scheduler.start()
+    market_data_retention.start()
+    startup_timings["startup"] = time.perf_counter() - started
+    logger.info("Started in %.3fs (imports %.3fs, startup %.3fs)",
+                time.perf_counter() - IMPORT_STARTED, startup_timings["import"], startup_timings["startup"])
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await ingestion_scheduler.stop()
+    await market_data_retention.stop()
+    await margin_monitor.stop()
+    await margin_history.stop()
+    quote_fetcher.shutdown()
     await Tortoise.close_connections()
+    shutdown_logging()
+
+
+GaugeCallback(
+    "app_startup_seconds", "Time spent importing the app and running its startup handler",
+    lambda: {(phase,): seconds for phase, seconds in startup_timings.items()},
+    ("phase",),
+)
+GaugeCallback(
+    "price_cache_stats", "Latest-price cache size, hits, misses and evictions",
+    lambda: {(key,): value for key, value in price_cache.stats().items() if key != "hit_rate"},
+    ("stat",),
+)
+GaugeCallback(
+    "account_cache_stats", "Account snapshot cache size, hits, misses, evictions, invalidations, stale hits and discarded loads",
+    lambda: {(key,): value for key, value in account_cache.stats().items() if key != "hit_rate"},
+    ("stat",),
+)
+GaugeCallback(
+    "margin_history_stats", "Margin snapshots pending, recorded, skipped as duplicates, dropped, written and failed",
+    lambda: {(key,): value for key, value in margin_history.stats().items()},
+    ("stat",),
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 # ---------------------------------------------------------------------------
@@ -38,222 +127,415 @@ async def shutdown_event():
 
 class AccountCreate(BaseModel):
     name: str = Field(..., min_length=1)
-    initial_balance: float
+    initial_balance: float = Field(..., le=config.MAX_TRANSACTION_AMOUNT)
 
 
 class TransactionAmount(BaseModel):
-    amount: float
+    amount: float = Field(..., le=config.MAX_TRANSACTION_AMOUNT)
 
 
 class Transfer(BaseModel):
     sender: str
     recipient: str
-    amount: float
+    amount: float = Field(..., le=config.MAX_TRANSACTION_AMOUNT)
 
 
-@app.get("/accounts")
-@app.get("/accounts/")
+class TransferBatch(BaseModel):
+    transfers: list[Transfer] = Field(..., min_length=1)
+
+
+@api.get("/accounts")
+@api.get("/accounts/")
 async def list_accounts():
-    clients = await Client.all().values("name", "balance")
-    return {"accounts": clients}
+    clients = await Client.all().using_db(read_db()).values_list("name", "balance")
+    return {"accounts": [{"name": name, "balance": from_micros(balance)} for name, balance in clients]}
 
 
-@app.post("/accounts/")
+@api.post("/accounts/")
 async def create_account(data: AccountCreate):
     existing = await Client.get_or_none(name=data.name)
     if existing:
         raise HTTPException(status_code=400, detail="Account already exists")
     if data.initial_balance < 0:
         raise HTTPException(status_code=400, detail="Initial balance must be non-negative")
-    await Client.create(name=data.name, balance=float(data.initial_balance))
+    await Client.create(name=data.name, balance=to_micros(data.initial_balance))
+    account_cache.invalidate(data.name)
     return {"message": f"Account '{data.name}' created."}
 
 
-@app.get("/accounts/{name}")
+@api.get("/accounts/{name}")
 async def get_balance(name: str):
-    client = await Client.get_or_none(name=name)
-    if not client:
+    snapshot = await account_cache.get(name)
+    if not snapshot:
         raise HTTPException(status_code=404, detail="Account not found")
-    return {"name": client.name, "balance": client.balance}
+    return {"name": snapshot["name"], "balance": from_micros(snapshot["balance"])}
 
 
-@app.post("/accounts/{name}/deposits")
+@api.post("/accounts/{name}/deposits")
 async def deposit(name: str, data: TransactionAmount):
-    client = await Client.get_or_none(name=name)
-    if not client:
-        raise HTTPException(status_code=404, detail="Account not found")
     if data.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
-    client.balance = float(client.balance) + float(data.amount)
-    await client.save()
+    updated = await Client.filter(name=name).update(
+        balance=F("balance") + to_micros(data.amount), version=F("version") + 1,
+    )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Account not found")
+    account_cache.invalidate(name)
     return {"message": f"{data.amount:.2f} deposited to {name}"}
 
 
-@app.post("/accounts/{name}/withdrawals")
+async def debit(name: str, amount: int, not_found_detail: str = "Account not found"):
+    """Debit ``amount`` micro-units only if the balance covers it, in a single statement."""
+    updated = await Client.filter(name=name, balance__gte=amount).update(
+        balance=F("balance") - amount, version=F("version") + 1,
+    )
+    if not updated:
+        if not await Client.exists(name=name):
+            raise HTTPException(status_code=404, detail=not_found_detail)
+        raise HTTPException(status_code=400, detail="Insufficient funds")
+
+
+@api.post("/accounts/{name}/withdrawals")
 async def withdraw(name: str, data: TransactionAmount):
-    client = await Client.get_or_none(name=name)
-    if not client:
-        raise HTTPException(status_code=404, detail="Account not found")
     if data.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
-    if float(client.balance) < data.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-    client.balance = float(client.balance) - float(data.amount)
-    await client.save()
+    await debit(name, to_micros(data.amount))
+    account_cache.invalidate(name)
     return {"message": f"{data.amount:.2f} withdrawn from {name}"}
 
 
-@app.post("/transfers")
+@api.post("/transfers")
 async def transfer(data: Transfer):
-    sender = await Client.get_or_none(name=data.sender)
-    recipient = await Client.get_or_none(name=data.recipient)
-    if not sender or not recipient:
-        raise HTTPException(status_code=404, detail="Sender or recipient not found")
     if data.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
-    if float(sender.balance) < data.amount:
-        raise HTTPException(status_code=400, detail="Insufficient funds")
-    sender.balance = float(sender.balance) - float(data.amount)
-    recipient.balance = float(recipient.balance) + float(data.amount)
-    await sender.save()
-    await recipient.save()
+    if data.sender == data.recipient:
+        raise HTTPException(status_code=400, detail="Sender and recipient must differ")
+    amount = to_micros(data.amount)
+    async with in_transaction("default"):
+        # Touch both rows in name order so opposite transfers cannot deadlock
+        for name in sorted((data.sender, data.recipient)):
+            if name == data.sender:
+                await debit(name, amount, "Sender or recipient not found")
+            elif not await Client.filter(name=name).update(balance=F("balance") + amount, version=F("version") + 1):
+                raise HTTPException(status_code=404, detail="Sender or recipient not found")
+    account_cache.invalidate(data.sender, data.recipient)
     return {"message": f"{data.amount:.2f} transferred from {data.sender} to {data.recipient}"}
 
 
+@api.post("/transfers/batch")
+async def transfer_batch(data: TransferBatch):
+    """Settle many transfers atomically by applying each account's net change once."""
+    if len(data.transfers) > config.TRANSFER_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {config.TRANSFER_BATCH_MAX_SIZE} transfers per batch")
+    deltas = defaultdict(int)
+    for i, item in enumerate(data.transfers):
+        if item.amount <= 0:
+            raise HTTPException(status_code=400, detail=f"Transfer {i}: amount must be positive")
+        if item.sender == item.recipient:
+            raise HTTPException(status_code=400, detail=f"Transfer {i}: sender and recipient must differ")
+        amount = to_micros(item.amount)
+        deltas[item.sender] -= amount
+        deltas[item.recipient] += amount
+
+    names = sorted(deltas)
+    async with in_transaction("default"):
+        found = set(await Client.filter(name__in=names).values_list("name", flat=True))
+        missing = [name for name in names if name not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Accounts not found: {', '.join(missing)}")
+
+        insufficient = []
+        # Deterministic lock order: every batch updates accounts sorted by name
+        for name in names:
+            delta = deltas[name]
+            if delta < 0:
+                query = Client.filter(name=name, balance__gte=-delta)
+            else:
+                query = Client.filter(name=name)
+            if not await query.update(balance=F("balance") + delta, version=F("version") + 1):
+                insufficient.append(name)
+        if insufficient:
+            raise HTTPException(status_code=400, detail=f"Insufficient funds: {', '.join(insufficient)}")
+    account_cache.invalidate(*names)
+
+    return {"message": f"{len(data.transfers)} transfers settled across {len(names)} accounts"}
+
+
+# ---------------------------------------------------------------------------
+# Bulk import API
+# ---------------------------------------------------------------------------
+
+@api.post("/imports/{kind}")
+async def import_book(kind: str, request: Request, format: Optional[str] = None,
+                      batch_size: int = Query(config.IMPORT_BATCH_SIZE, gt=0, le=config.IMPORT_MAX_BATCH_SIZE)):
+    if kind not in IMPORTERS:
+        raise HTTPException(status_code=404, detail=f"Unknown import kind, expected one of {', '.join(IMPORTERS)}")
+    if format is None:
+        format = "ndjson" if "ndjson" in request.headers.get("content-type", "") else "csv"
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be csv or ndjson")
+    result = await import_stream(kind, request.stream(), format, batch_size)
+    if result["imported"] and kind != "clients":
+        await margin_monitor.rebuild()
+    return result
+
+
 # ---------------------------------------------------------------------------
 # Stocks API
 # ---------------------------------------------------------------------------
 
 @log_function
 async def get_stock_data(symbol: str):
-    try:
-        stock = Ticker(symbol)
-        info = stock.history(period="1d", interval="1m").tail(1)
-        if info.empty:
-            raise HTTPException(status_code=404, detail="Stock data not available")
-    except Exception as e:
-        logging.error(f"Error fetching data for stock {symbol}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch stock data")
-
-    timestamp = info.index[0]
-    current_price = Decimal(info['Close'].iloc[0]).quantize(Decimal('0.001'), rounding=ROUND_UP)
-    return timestamp, current_price
+    return await quote_fetcher.get(symbol)
 
 
-@app.get("/stocks/{symbol}")
+@api.get("/stocks/{symbol}")
 @log_function
 async def fetch_stock(symbol: str):
     try:
-        timestamp, current_price = await get_stock_data(symbol)
+        timestamp, current_price, stale, bars = await get_stock_data(symbol)
     except HTTPException as http_exc:
-        logging.error(f"HTTPException occurred for symbol {symbol}: {http_exc.detail}")
+        logger.error("HTTPException occurred for symbol %s: %s", symbol, http_exc.detail)
         raise http_exc
 
+    if stale:
+        return {"symbol": symbol, "timestamp": timestamp, "current_price": from_micros(current_price), "stale": True}
+
     try:
-        await MarketData.create(symbol=symbol, timestamp=timestamp, current_price=current_price)
+        # Skipped if this bar is already stored, e.g. by the ingestion scheduler
+        await store_ticks({symbol: (timestamp, current_price)})
     except Exception as e:
-        logging.error(f"Error storing stock data for symbol {symbol}: {e}")
+        logger.error("Error storing stock data for symbol %s: %s", symbol, e)
         raise HTTPException(status_code=500, detail="Failed to store stock data in the database")
-
-    return {"symbol": symbol, "timestamp": timestamp, "current_price": current_price}
-
-
-@app.get("/stocks")
-@log_function
-async def get_stock_data_from_db():
+    price_cache.put(symbol, current_price, timestamp)
+    margin_monitor.on_ticks({symbol: current_price})
+    try:
+        await price_bar_writer.upsert({symbol: bars})
+    except Exception as e:
+        logger.error("Error storing price bars for symbol %s: %s", symbol, e)
+
+    return {"symbol": symbol, "timestamp": timestamp, "current_price": from_micros(current_price)}
+
+
+@api.get("/stocks")
+async def get_stock_data_from_db(symbol: Optional[str] = None, start: Optional[datetime] = None,
+                                 end: Optional[datetime] = None, cursor: Optional[str] = None,
+                                 limit: int = Query(config.STOCKS_PAGE_SIZE, gt=0, le=config.STOCKS_MAX_PAGE_SIZE),
+                                 format: str = "json"):
+    query = market_data_query(symbol, start, end)
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(query), media_type="application/x-ndjson")
+    if format == "csv":
+        return StreamingResponse(stream_csv(query), media_type="text/csv",
+                                 headers={"Content-Disposition": "attachment; filename=stocks.csv"})
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Format must be one of json, ndjson, csv")
+
+    after = decode_cursor(cursor) if cursor else None
     try:
-        data = await MarketData.all().values()
+        data = await fetch_page(query, after, limit)
     except Exception as e:
-        logging.error(f"Error fetching stock data from the database: {e}")
+        logger.error("Error fetching stock data from the database: %s", e)
         raise HTTPException(status_code=500, detail="Error fetching stock data from the database")
-    return data
+    next_cursor = encode_cursor(data[-1]) if len(data) == limit else None
+    return {"data": data, "next_cursor": next_cursor}
+
+
+@api.get("/stocks/{symbol}/history")
+async def get_stock_history(symbol: str, interval: str = "1d", start: Optional[datetime] = None,
+                            end: Optional[datetime] = None, limit: int = Query(500, gt=0, le=5000)):
+    if interval not in ROLLUP_INTERVALS:
+        raise HTTPException(status_code=400, detail=f"Interval must be one of {', '.join(ROLLUP_INTERVALS)}")
+    query = MarketDataRollup.filter(symbol=symbol, interval=interval).using_db(read_db())
+    if start is not None:
+        query = query.filter(bucket__gte=start)
+    if end is not None:
+        query = query.filter(bucket__lt=end)
+    try:
+        bars = await query.order_by("-bucket").limit(limit) \
+            .values("bucket", "open", "high", "low", "close", "tick_count")
+    except Exception as e:
+        logger.error("Error fetching %s history for %s: %s", interval, symbol, e)
+        raise HTTPException(status_code=500, detail="Error fetching stock history from the database")
+    for bar in bars:
+        for field in ("open", "high", "low", "close"):
+            bar[field] = from_micros(bar[field])
+    return {"symbol": symbol, "interval": interval, "bars": bars[::-1]}
 
 
 # ---------------------------------------------------------------------------
 # Positions & Margin API (using account name instead of integer id)
 # ---------------------------------------------------------------------------
 
-@app.get("/positions/{name}")
+@api.get("/positions/{name}")
 @log_function
 async def get_client_positions(name: str):
     try:
-        client = await Client.get_or_none(name=name).prefetch_related("positions")
-        if not client:
-            raise HTTPException(status_code=404, detail="Account not found")
+        snapshot = await account_cache.get(name)
     except Exception as e:
-        logging.error(f"Error fetching positions for {name}: {e}")
+        logger.error("Error fetching positions for %s: %s", name, e)
         raise HTTPException(status_code=500, detail="Error fetching client positions")
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Account not found")
 
     positions = [
-        {"symbol": pos.symbol, "quantity": pos.quantity, "cost_basis": float(pos.cost_basis)}
-        for pos in await client.positions.all()
+        {"symbol": pos["symbol"], "quantity": pos["quantity"], "cost_basis": from_micros(pos["cost_basis"])}
+        for pos in snapshot["positions"]
     ]
     return {"name": name, "positions": positions}
 
 
-@app.get("/margin/{name}")
-@log_function
-async def get_margin_status(name: str):
+class StressScenario(BaseModel):
+    name: Optional[str] = None
+    shock: float = Field(0.0, gt=-1)
+    symbol_shocks: dict[str, Annotated[float, Field(gt=-1)]] = Field(default_factory=dict)
+    mmr: Optional[float] = Field(None, ge=0)
+
+
+class StressRequest(BaseModel):
+    scenarios: list[StressScenario] = Field(..., min_length=1, max_length=config.STRESS_MAX_SCENARIOS)
+
+
+@api.post("/stress")
+async def stress_test(data: StressRequest):
     try:
-        client = await Client.get_or_none(name=name)
-        if not client:
-            raise HTTPException(status_code=404, detail="Account not found")
+        return await run_stress_test([scenario.model_dump() for scenario in data.scenarios])
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error fetching client {name}: {e}")
-        raise HTTPException(status_code=500, detail="Error fetching client data")
+        logger.error("Error running stress test: %s", e)
+        raise HTTPException(status_code=500, detail="Error running stress test")
+
+
+@api.get("/events/margin-calls")
+async def stream_margin_calls(request: Request):
+    """Server-sent events for accounts entering or leaving a margin call."""
+    queue = margin_monitor.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), config.MARGIN_EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            margin_monitor.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@api.get("/margin")
+async def get_firm_margin_status():
+    try:
+        return await get_all_margin_status()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error computing firm-wide margin status: %s", e)
+        raise HTTPException(status_code=500, detail="Error computing margin status")
+
 
+@api.get("/margin/{name}")
+@log_function
+async def get_margin_status(name: str):
     try:
-        await client.fetch_related("positions", "margins")
-        margin_account = await client.margins.all()
-        if not margin_account:
-            raise HTTPException(status_code=404, detail="Margin account not found")
-        margin_account = margin_account[0]
+        snapshot = await account_cache.get(name)
     except Exception as e:
-        logging.error(f"Error fetching margin account for {name}: {e}")
-        raise HTTPException(status_code=500, detail="Error fetching margin account")
+        logger.error("Error fetching client %s: %s", name, e)
+        raise HTTPException(status_code=500, detail="Error fetching client data")
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Account not found")
+    if snapshot["loan"] is None:
+        raise HTTPException(status_code=404, detail="Margin account not found")
 
-    total_value = Decimal(0)
-    positions = await client.positions.all()
+    total_value = 0
+    # Sum of value * rate per position; in flat mode every rate is MMR
+    rate_products = 0
+    positions = snapshot["positions"]
     if not positions:
         raise HTTPException(status_code=404, detail="No positions found for this account")
 
+    rates = await margin_rates.get()
     for position in positions:
         try:
-            marketData = await fetch_latest_price(position.symbol, MarketData)
+            marketData = await fetch_latest_price(position["symbol"], MarketData, read_db())
             if "error" in marketData:
-                raise HTTPException(status_code=404, detail=f"Market data not found for {position.symbol}")
-            total_value += Decimal(position.quantity) * Decimal(marketData["current_price"]).quantize(Decimal('0.001'), rounding=ROUND_UP)
+                raise HTTPException(status_code=404, detail=f"Market data not found for {position['symbol']}")
+            value = (position["quantity"] or 0) * marketData["current_price"]
+            total_value += value
+            rate_products += value * margin_rates.rate(rates, position["symbol"])
         except HTTPException as e:
             raise e
 
-    net_equity = Decimal(total_value) - Decimal(margin_account.loan).quantize(Decimal('0.001'), rounding=ROUND_UP)
-    margin_account.margin_requirement = (Decimal(total_value) * Decimal(config.MMR)).quantize(Decimal('0.001'), rounding=ROUND_UP)
+    loan = snapshot["loan"]
+    net_equity = total_value - loan
+    margin_requirement = rate_products_to_micros(rate_products)
 
-    try:
-        if margin_account:
-            margin, created = await Margin.update_or_create(
-                client_id=client.id,
-                defaults={'margin_requirement': margin_account.margin_requirement, 'loan': margin_account.loan}
-            )
-    except Exception as e:
-        logging.error(f"Error updating margin account for {name}: {e}")
-        raise HTTPException(status_code=500, detail="Error updating margin account")
+    # Appended to the margin history in the background; the read itself does not write
+    margin_history.record(snapshot["id"], total_value, loan, margin_requirement, marketData["timestamp"])
 
-    margin_shortfall = (margin_account.margin_requirement - net_equity).quantize(Decimal('0.001'), rounding=ROUND_UP)
+    margin_shortfall = margin_requirement - net_equity
     margin_call_triggered = margin_shortfall > 0
 
     return {
         "timestamp": marketData["timestamp"],
         "name": name,
-        "portfolio_value": float(total_value),
-        "loan_amount": float(margin_account.loan),
-        "net_equity": float(net_equity),
-        "margin_requirement": float(margin_account.margin_requirement),
-        "margin_shortfall": float(margin_shortfall),
+        "portfolio_value": from_micros(total_value),
+        "loan_amount": from_micros(loan),
+        "net_equity": from_micros(net_equity),
+        "margin_requirement": from_micros(margin_requirement),
+        "margin_shortfall": from_micros(margin_shortfall),
         "margin_call_triggered": margin_call_triggered
     }
 
 
+@api.get("/margin/{name}/history")
+async def get_margin_history(name: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                             limit: int = Query(500, gt=0, le=5000)):
+    try:
+        snapshot = await account_cache.get(name)
+    except Exception as e:
+        logger.error("Error fetching client %s: %s", name, e)
+        raise HTTPException(status_code=500, detail="Error fetching client data")
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    query = MarginSnapshot.filter(client_id=snapshot["id"]).using_db(read_db())
+    if start is not None:
+        query = query.filter(timestamp__gte=start)
+    if end is not None:
+        query = query.filter(timestamp__lt=end)
+    try:
+        rows = await query.order_by("-timestamp", "-id").limit(limit).values(
+            "timestamp", "priced_at", "portfolio_value", "loan", "margin_requirement", "margin_call_triggered",
+        )
+    except Exception as e:
+        logger.error("Error fetching margin history for %s: %s", name, e)
+        raise HTTPException(status_code=500, detail="Error fetching margin history from the database")
+
+    history = []
+    for row in reversed(rows):
+        net_equity = row["portfolio_value"] - row["loan"]
+        history.append({
+            "timestamp": row["timestamp"],
+            "priced_at": row["priced_at"],
+            "portfolio_value": from_micros(row["portfolio_value"]),
+            "loan_amount": from_micros(row["loan"]),
+            "net_equity": from_micros(net_equity),
+            "margin_requirement": from_micros(row["margin_requirement"]),
+            "margin_shortfall": from_micros(row["margin_requirement"] - net_equity),
+            "margin_call_triggered": row["margin_call_triggered"],
+        })
+    return {"name": name, "history": history}
+
+
+app.include_router(auth_router)
+app.include_router(api)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
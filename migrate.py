@@ -0,0 +1,35 @@
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from db_config import apply_migrations, available_migrations, pending_migrations, tortoise_config
+
+
+async def migrate(db_url: str, status: bool):
+    """Apply pending schema migrations to the primary database, or list them with ``--status``."""
+    await Tortoise.init(config=tortoise_config(db_url, read_url=""))
+    try:
+        if status:
+            pending = {name for _, name in await pending_migrations()}
+            for _, name in available_migrations():
+                print(f"  {'pending' if name in pending else 'applied'}  {name}")
+            return
+        applied = await apply_migrations()
+        for name in applied:
+            print(f"  ✓ {name}")
+        print(f"  {len(applied)} migrations applied" if applied else "  Schema is up to date")
+    finally:
+        await Tortoise.close_connections()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations. Run once per deploy, not per worker.")
+    parser.add_argument("--db-url", default=None, help="defaults to DATABASE_URL")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.db_url, args.status))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Baseline schema: clients, positions, ticks, OHLC rollups and margin loans, money in micro-units.
+
+Every statement is ``IF NOT EXISTS``, so a database created earlier by
+``generate_schemas`` is simply recorded as being at this version.
+"""
+
+UPGRADE = {
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS "client" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "name" VARCHAR(255) NOT NULL UNIQUE,
+    "balance" BIGINT NOT NULL DEFAULT 0
+)""",
+        """CREATE TABLE IF NOT EXISTS "margin" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "margin_requirement" BIGINT NOT NULL,
+    "loan" BIGINT NOT NULL,
+    "timestamp" TIMESTAMP NOT NULL,
+    "client_id" INT NOT NULL REFERENCES "client" ("id") ON DELETE CASCADE
+)""",
+        """CREATE TABLE IF NOT EXISTS "marketdata" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "symbol" VARCHAR(50) NOT NULL,
+    "current_price" BIGINT NOT NULL,
+    "timestamp" TIMESTAMP NOT NULL
+)""",
+        """CREATE INDEX IF NOT EXISTS "idx_marketdata_symbol_26cc81" ON "marketdata" ("symbol", "timestamp")""",
+        """CREATE TABLE IF NOT EXISTS "marketdatarollup" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "symbol" VARCHAR(50) NOT NULL,
+    "interval" VARCHAR(8) NOT NULL,
+    "bucket" TIMESTAMP NOT NULL,
+    "open" BIGINT NOT NULL,
+    "high" BIGINT NOT NULL,
+    "low" BIGINT NOT NULL,
+    "close" BIGINT NOT NULL,
+    "tick_count" INT NOT NULL DEFAULT 0,
+    "first_tick_at" TIMESTAMP NOT NULL,
+    "last_tick_at" TIMESTAMP NOT NULL,
+    CONSTRAINT "uid_marketdatar_symbol_25743f" UNIQUE ("symbol", "interval", "bucket")
+)""",
+        """CREATE TABLE IF NOT EXISTS "position" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "symbol" VARCHAR(10) NOT NULL,
+    "quantity" INT,
+    "cost_basis" BIGINT NOT NULL,
+    "client_id" INT NOT NULL REFERENCES "client" ("id") ON DELETE CASCADE
+)""",
+    ],
+    "postgres": [
+        """CREATE TABLE IF NOT EXISTS "client" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "name" VARCHAR(255) NOT NULL UNIQUE,
+    "balance" BIGINT NOT NULL DEFAULT 0
+)""",
+        """CREATE TABLE IF NOT EXISTS "margin" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "margin_requirement" BIGINT NOT NULL,
+    "loan" BIGINT NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL,
+    "client_id" INT NOT NULL REFERENCES "client" ("id") ON DELETE CASCADE
+)""",
+        """CREATE TABLE IF NOT EXISTS "marketdata" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "symbol" VARCHAR(50) NOT NULL,
+    "current_price" BIGINT NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL
+)""",
+        """CREATE INDEX IF NOT EXISTS "idx_marketdata_symbol_26cc81" ON "marketdata" ("symbol", "timestamp")""",
+        """CREATE TABLE IF NOT EXISTS "marketdatarollup" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "symbol" VARCHAR(50) NOT NULL,
+    "interval" VARCHAR(8) NOT NULL,
+    "bucket" TIMESTAMPTZ NOT NULL,
+    "open" BIGINT NOT NULL,
+    "high" BIGINT NOT NULL,
+    "low" BIGINT NOT NULL,
+    "close" BIGINT NOT NULL,
+    "tick_count" INT NOT NULL DEFAULT 0,
+    "first_tick_at" TIMESTAMPTZ NOT NULL,
+    "last_tick_at" TIMESTAMPTZ NOT NULL,
+    CONSTRAINT "uid_marketdatar_symbol_25743f" UNIQUE ("symbol", "interval", "bucket")
+)""",
+        """CREATE TABLE IF NOT EXISTS "position" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "symbol" VARCHAR(10) NOT NULL,
+    "quantity" INT,
+    "cost_basis" BIGINT NOT NULL,
+    "client_id" INT NOT NULL REFERENCES "client" ("id") ON DELETE CASCADE
+)""",
+    ],
+}
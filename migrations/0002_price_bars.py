@@ -0,0 +1,30 @@
+"""One-minute OHLCV bars kept from quote and ingestion downloads, one row per symbol and minute."""
+
+UPGRADE = {
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS "pricebar" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "symbol" VARCHAR(50) NOT NULL,
+    "timestamp" TIMESTAMP NOT NULL,
+    "open" BIGINT NOT NULL,
+    "high" BIGINT NOT NULL,
+    "low" BIGINT NOT NULL,
+    "close" BIGINT NOT NULL,
+    "volume" BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT "uid_pricebar_symbol_da5de2" UNIQUE ("symbol", "timestamp")
+)""",
+    ],
+    "postgres": [
+        """CREATE TABLE IF NOT EXISTS "pricebar" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "symbol" VARCHAR(50) NOT NULL,
+    "timestamp" TIMESTAMPTZ NOT NULL,
+    "open" BIGINT NOT NULL,
+    "high" BIGINT NOT NULL,
+    "low" BIGINT NOT NULL,
+    "close" BIGINT NOT NULL,
+    "volume" BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT "uid_pricebar_symbol_da5de2" UNIQUE ("symbol", "timestamp")
+)""",
+    ],
+}
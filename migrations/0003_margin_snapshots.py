@@ -0,0 +1,30 @@
+"""Append-only margin status history written behind GET /margin/{name}, money in micro-units."""
+
+UPGRADE = {
+    "sqlite": [
+        """CREATE TABLE IF NOT EXISTS "marginsnapshot" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    "portfolio_value" BIGINT NOT NULL,
+    "loan" BIGINT NOT NULL,
+    "margin_requirement" BIGINT NOT NULL,
+    "margin_call_triggered" INT NOT NULL,
+    "priced_at" TIMESTAMP,
+    "timestamp" TIMESTAMP NOT NULL,
+    "client_id" INT NOT NULL REFERENCES "client" ("id") ON DELETE CASCADE
+)""",
+        """CREATE INDEX IF NOT EXISTS "idx_marginsnaps_client__e0a9eb" ON "marginsnapshot" ("client_id", "timestamp")""",
+    ],
+    "postgres": [
+        """CREATE TABLE IF NOT EXISTS "marginsnapshot" (
+    "id" BIGSERIAL NOT NULL PRIMARY KEY,
+    "portfolio_value" BIGINT NOT NULL,
+    "loan" BIGINT NOT NULL,
+    "margin_requirement" BIGINT NOT NULL,
+    "margin_call_triggered" BOOL NOT NULL,
+    "priced_at" TIMESTAMPTZ,
+    "timestamp" TIMESTAMPTZ NOT NULL,
+    "client_id" INT NOT NULL REFERENCES "client" ("id") ON DELETE CASCADE
+)""",
+        """CREATE INDEX IF NOT EXISTS "idx_marginsnaps_client__e0a9eb" ON "marginsnapshot" ("client_id", "timestamp")""",
+    ],
+}
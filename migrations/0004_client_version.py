@@ -0,0 +1,10 @@
+"""Per-client write counter that lets every worker's account cache spot writes made elsewhere."""
+
+UPGRADE = {
+    "sqlite": [
+        """ALTER TABLE "client" ADD COLUMN "version" BIGINT NOT NULL DEFAULT 0""",
+    ],
+    "postgres": [
+        """ALTER TABLE "client" ADD COLUMN IF NOT EXISTS "version" BIGINT NOT NULL DEFAULT 0""",
+    ],
+}
@@ -0,0 +1,10 @@
+"""Index behind the (timestamp, id) keyset pages of GET /stocks and its NDJSON/CSV exports."""
+
+UPGRADE = {
+    "sqlite": [
+        """CREATE INDEX IF NOT EXISTS "idx_marketdata_timesta_29f59e" ON "marketdata" ("timestamp", "id")""",
+    ],
+    "postgres": [
+        """CREATE INDEX IF NOT EXISTS "idx_marketdata_timesta_29f59e" ON "marketdata" ("timestamp", "id")""",
+    ],
+}
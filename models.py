@@ -5,9 +5,11 @@ import datetime
 class Client(Model):
     id = fields.IntField(pk=True)
     name = fields.CharField(max_length=255, unique=True)
-    balance = fields.FloatField(default=0)
+    balance = fields.BigIntField(default=0)  # Micro-units, see utils/money/fixed_point.py
+    version = fields.BigIntField(default=0)  # Bumped by every write to the account, see account_cache.py
     positions = fields.ReverseRelation["Position"]
     margins = fields.ReverseRelation["Margin"]
+    margin_snapshots = fields.ReverseRelation["MarginSnapshot"]
     def __repr__(self):
         return f"Client(id={self.id}, name={self.name})"
 
@@ -15,7 +17,7 @@ class Position(Model):
     id = fields.IntField(pk=True)
     symbol = fields.CharField(max_length=10)
     quantity = fields.IntField(null=True)
-    cost_basis = fields.FloatField()
+    cost_basis = fields.BigIntField()  # Micro-units
     client = fields.ForeignKeyField("models.Client", related_name="positions")
     def __repr__(self):
         return f"<Position(id={self.id}, symbol={self.symbol}, quantity={self.quantity}, cost_basis={self.cost_basis})>"
@@ -23,14 +25,72 @@ class Position(Model):
 class MarketData(Model):
     id = fields.IntField(pk=True)
     symbol = fields.CharField(max_length=50)
-    current_price = fields.FloatField()
+    current_price = fields.BigIntField()  # Micro-units
     timestamp = fields.DatetimeField(default=datetime.datetime.now)
+
+    class Meta:
+        # Serves "latest row per symbol" lookups without sorting the whole table,
+        # and keyset pages of /stocks and its exports ordered by (timestamp, id)
+        indexes = (("symbol", "timestamp"), ("timestamp", "id"))
+
     def __repr__(self):
         return f"<MarketData(id={self.id}, symbol={self.symbol}, current_price={self.current_price}, timestamp={self.timestamp})>"
 
+class MarketDataRollup(Model):
+    id = fields.IntField(pk=True)
+    symbol = fields.CharField(max_length=50)
+    interval = fields.CharField(max_length=8)  # "1m" or "1d"
+    bucket = fields.DatetimeField()  # Start of the interval in UTC
+    open = fields.BigIntField()  # Prices in micro-units
+    high = fields.BigIntField()
+    low = fields.BigIntField()
+    close = fields.BigIntField()
+    tick_count = fields.IntField(default=0)
+    first_tick_at = fields.DatetimeField()
+    last_tick_at = fields.DatetimeField()
+
+    class Meta:
+        unique_together = (("symbol", "interval", "bucket"),)
+
+    def __repr__(self):
+        return f"<MarketDataRollup(symbol={self.symbol}, interval={self.interval}, bucket={self.bucket}, close={self.close})>"
+
+class PriceBar(Model):
+    id = fields.IntField(pk=True)
+    symbol = fields.CharField(max_length=50)
+    timestamp = fields.DatetimeField()  # Start of the one-minute bar in UTC
+    open = fields.BigIntField()  # Prices in micro-units
+    high = fields.BigIntField()
+    low = fields.BigIntField()
+    close = fields.BigIntField()
+    volume = fields.BigIntField(default=0)
+
+    class Meta:
+        unique_together = (("symbol", "timestamp"),)
+
+    def __repr__(self):
+        return f"<PriceBar(symbol={self.symbol}, timestamp={self.timestamp}, close={self.close}, volume={self.volume})>"
+
 class Margin(Model):
     id = fields.IntField(pk=True)  # Auto-increment primary key
     client = fields.ForeignKeyField("models.Client", related_name="margins", on_delete=fields.CASCADE)
-    margin_requirement = fields.FloatField()
-    loan = fields.FloatField()
-    timestamp = fields.DatetimeField(default=datetime.datetime.now)
\ No newline at end of file
+    margin_requirement = fields.BigIntField()  # Micro-units
+    loan = fields.BigIntField()  # Micro-units
+    timestamp = fields.DatetimeField(default=datetime.datetime.now)
+
+class MarginSnapshot(Model):
+    id = fields.BigIntField(pk=True)
+    client = fields.ForeignKeyField("models.Client", related_name="margin_snapshots", on_delete=fields.CASCADE)
+    portfolio_value = fields.BigIntField()  # Micro-units
+    loan = fields.BigIntField()  # Micro-units
+    margin_requirement = fields.BigIntField()  # Micro-units
+    margin_call_triggered = fields.BooleanField()
+    priced_at = fields.DatetimeField(null=True)  # Timestamp of the market data used
+    timestamp = fields.DatetimeField()  # When the status was computed
+
+    class Meta:
+        # Append-only history, read per account and time range
+        indexes = (("client_id", "timestamp"),)
+
+    def __repr__(self):
+        return f"<MarginSnapshot(client_id={self.client_id}, timestamp={self.timestamp}, margin_requirement={self.margin_requirement})>"
@@ -0,0 +1,124 @@
+# Read-through cache of per-account snapshots for the account, position and margin routes
+from collections import OrderedDict
+import time
+
+import config
+from models import Client, Margin, Position
+
+
+async def load_account_snapshot(name):
+    """Balance, positions and first margin loan of ``name`` in micro-units, or None.
+
+    Reads the primary rather than the replica: a lagging replica could
+    refill the cache with the state a write has just invalidated.
+    """
+    client = await Client.filter(name=name).first().values("id", "name", "balance", "version")
+    if client is None:
+        return None
+    positions = await Position.filter(client_id=client["id"]).order_by("id") \
+        .values("symbol", "quantity", "cost_basis")
+    # The margin path reads a client's first margin row
+    margin = await Margin.filter(client_id=client["id"]).order_by("id").first().values("loan")
+    return {**client, "positions": positions, "loan": margin["loan"] if margin else None}
+
+
+async def load_account_version(name):
+    """The write counter of ``name`` on the primary, or None if there is no such account."""
+    return await Client.filter(name=name).first().values_list("version", flat=True)
+
+
+class AccountSnapshotCache:
+    """Name-keyed account snapshots with a TTL and LRU eviction.
+
+    Every write bumps ``Client.version`` in its own transaction, and a hit
+    is only served once an indexed lookup on the primary confirms that the
+    account's version still matches the snapshot's, so writes made by any
+    worker are seen at once. Write paths in this process also call
+    ``invalidate`` after their transaction commits. A load records how
+    often the account was invalidated when it starts and only stores its
+    result if no invalidation happened meanwhile, so a read racing a write
+    can never cache the pre-write state. Counts are only tracked while a
+    load is in flight, keeping memory bounded by ``max_size``. Snapshots
+    are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, loader=load_account_snapshot, version_loader=load_account_version,
+                 ttl_seconds=config.ACCOUNT_CACHE_TTL_SECONDS, max_size=config.ACCOUNT_CACHE_MAX_SIZE):
+        self.loader = loader
+        self.version_loader = version_loader
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+        self.discarded_loads = 0
+        self._entries = OrderedDict()
+        self._loads = {}  # name -> [invalidations, loads in flight]
+
+    async def get(self, name):
+        entry = self._entries.get(name)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            if await self.version_loader(name) == entry[1]["version"]:
+                # An invalidation or eviction may have removed it during the check
+                if self._entries.get(name) is entry:
+                    self._entries.move_to_end(name)
+                self.hits += 1
+                return entry[1]
+            # Written by another worker since it was cached
+            self.stale += 1
+            if self._entries.get(name) is entry:
+                del self._entries[name]
+        self.misses += 1
+
+        load = self._loads.setdefault(name, [0, 0])
+        version = load[0]
+        load[1] += 1
+        try:
+            snapshot = await self.loader(name)
+        finally:
+            load[1] -= 1
+            if not load[1]:
+                del self._loads[name]
+        if load[0] != version:
+            self.discarded_loads += 1
+        elif snapshot is not None:
+            self._put(name, snapshot)
+        return snapshot
+
+    def _put(self, name, snapshot):
+        self._entries[name] = (time.monotonic(), snapshot)
+        self._entries.move_to_end(name)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *names):
+        for name in names:
+            self.invalidations += 1
+            self._entries.pop(name, None)
+            load = self._loads.get(name)
+            if load is not None:
+                load[0] += 1
+
+    def clear(self):
+        self._entries.clear()
+        for load in self._loads.values():
+            load[0] += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale": self.stale,
+            "discarded_loads": self.discarded_loads,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+account_cache = AccountSnapshotCache()
@@ -0,0 +1,218 @@
+# Streaming bulk import of clients, positions and margin loans
+import codecs
+import csv
+import json
+import logging
+
+from pydantic import BaseModel, Field, ValidationError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+import config
+from models import Client, Margin, Position
+from utils.accounts.account_cache import account_cache
+from utils.money.fixed_point import to_micros
+
+logger = logging.getLogger(__name__)
+
+MAX_ERRORS_PER_CHUNK = 100
+
+
+class ClientRow(BaseModel):
+    name: str = Field(..., min_length=1, max_length=255)
+    balance: float = Field(0, ge=0)
+
+
+class PositionRow(BaseModel):
+    client: str = Field(..., min_length=1)
+    symbol: str = Field(..., min_length=1, max_length=10)
+    quantity: int
+    cost_basis: float = Field(..., ge=0)
+
+
+class MarginRow(BaseModel):
+    client: str = Field(..., min_length=1)
+    loan: float = Field(..., ge=0)
+    margin_requirement: float = Field(0, ge=0)
+
+
+async def iter_lines(byte_chunks):
+    """Split a stream of byte chunks into decoded lines without buffering the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+    async for chunk in byte_chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines, fmt):
+    """Yield ``(line_number, record_or_error)`` from CSV or NDJSON lines.
+
+    CSV rows must not contain embedded newlines.
+    """
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+        elif header is None:
+            header = next(csv.reader([line]))
+        else:
+            values = next(csv.reader([line]))
+            if len(values) != len(header):
+                yield line_number, ValueError(f"Expected {len(header)} columns, got {len(values)}")
+            else:
+                yield line_number, dict(zip(header, values))
+
+
+async def _write_clients(rows):
+    # Later rows for the same name win, as they would with row-by-row upserts
+    latest = {row.name: row for _, row in rows}
+    existing = {client.name: client for client in await Client.filter(name__in=list(latest))}
+    created = []
+    for name, row in latest.items():
+        client = existing.get(name)
+        if client is None:
+            created.append(Client(name=name, balance=to_micros(row.balance)))
+        else:
+            client.balance = to_micros(row.balance)
+    if existing:
+        await Client.bulk_update(list(existing.values()), fields=["balance"])
+    if created:
+        await Client.bulk_create(created)
+    return len(rows), []
+
+
+async def _client_ids(rows):
+    return dict(await Client.filter(name__in=list({row.client for _, row in rows})).values_list("name", "id"))
+
+
+async def _write_positions(rows):
+    ids = await _client_ids(rows)
+    errors = [(line, f"Account not found: {row.client}") for line, row in rows if row.client not in ids]
+    rows = [(line, row) for line, row in rows if row.client in ids]
+
+    existing = {
+        (position.client_id, position.symbol): position
+        for position in await Position.filter(
+            client_id__in=list(ids.values()), symbol__in=list({row.symbol for _, row in rows}),
+        )
+    }
+    updated, created = {}, []
+    for _, row in rows:
+        key = (ids[row.client], row.symbol)
+        position = existing.get(key)
+        if position is None:
+            position = Position(client_id=key[0], symbol=row.symbol, quantity=row.quantity, cost_basis=to_micros(row.cost_basis))
+            existing[key] = position
+            created.append(position)
+        else:
+            position.quantity, position.cost_basis = row.quantity, to_micros(row.cost_basis)
+            if position.pk is not None:
+                updated[key] = position
+    if updated:
+        await Position.bulk_update(list(updated.values()), fields=["quantity", "cost_basis"])
+    if created:
+        await Position.bulk_create(created)
+    return len(rows), errors
+
+
+async def _write_margins(rows):
+    ids = await _client_ids(rows)
+    errors = [(line, f"Account not found: {row.client}") for line, row in rows if row.client not in ids]
+    rows = [(line, row) for line, row in rows if row.client in ids]
+
+    existing = {}
+    # The margin path reads a client's first margin row, so that is the one updated
+    for margin in await Margin.filter(client_id__in=list(ids.values())).order_by("id"):
+        existing.setdefault(margin.client_id, margin)
+    updated, created = {}, []
+    for _, row in rows:
+        client_id = ids[row.client]
+        margin = existing.get(client_id)
+        if margin is None:
+            margin = Margin(client_id=client_id, loan=to_micros(row.loan), margin_requirement=to_micros(row.margin_requirement))
+            existing[client_id] = margin
+            created.append(margin)
+        else:
+            margin.loan, margin.margin_requirement = to_micros(row.loan), to_micros(row.margin_requirement)
+            if margin.pk is not None:
+                updated[client_id] = margin
+    if updated:
+        await Margin.bulk_update(list(updated.values()), fields=["loan", "margin_requirement"])
+    if created:
+        await Margin.bulk_create(created)
+    return len(rows), errors
+
+
+IMPORTERS = {
+    "clients": (ClientRow, _write_clients),
+    "positions": (PositionRow, _write_positions),
+    "margins": (MarginRow, _write_margins),
+}
+
+
+async def _flush(kind, chunk_number, rows, errors):
+    _, write = IMPORTERS[kind]
+    received = len(rows) + len(errors)
+    imported = 0
+    if rows:
+        try:
+            names = list({row.name if kind == "clients" else row.client for _, row in rows})
+            async with in_transaction("default"):
+                imported, write_errors = await write(rows)
+                # Tells the account cache of every worker that these accounts changed
+                await Client.filter(name__in=names).update(version=F("version") + 1)
+            account_cache.invalidate(*names)
+            errors = sorted(errors + write_errors)
+        except Exception as e:
+            logger.error("Error importing %s chunk %s: %s", kind, chunk_number, e)
+            errors = errors + [(rows[0][0], f"Chunk rolled back: {e}")]
+    logger.info("Imported %s chunk %s: %s of %s rows", kind, chunk_number, imported, received)
+    return {
+        "chunk": chunk_number,
+        "rows": received,
+        "imported": imported,
+        "error_count": len(errors),
+        "errors": [{"line": line, "error": error} for line, error in errors[:MAX_ERRORS_PER_CHUNK]],
+    }
+
+
+async def import_stream(kind, byte_chunks, fmt="csv", batch_size=config.IMPORT_BATCH_SIZE):
+    """Validate and write a streamed file chunk by chunk; memory is bounded by ``batch_size``."""
+    row_model, _ = IMPORTERS[kind]
+    reports = []
+    rows, errors = [], []
+    async for line_number, record in iter_records(iter_lines(byte_chunks), fmt):
+        if isinstance(record, Exception):
+            errors.append((line_number, str(record)))
+        else:
+            try:
+                rows.append((line_number, row_model.model_validate(record)))
+            except ValidationError as e:
+                errors.append((line_number, "; ".join(
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+                )))
+        if len(rows) + len(errors) >= batch_size:
+            reports.append(await _flush(kind, len(reports) + 1, rows, errors))
+            rows, errors = [], []
+    if rows or errors:
+        reports.append(await _flush(kind, len(reports) + 1, rows, errors))
+
+    return {
+        "kind": kind,
+        "imported": sum(report["imported"] for report in reports),
+        "errors": sum(report["error_count"] for report in reports),
+        "chunks": reports,
+    }
@@ -0,0 +1,177 @@
+# Queue-based logging: request handlers only enqueue, a worker thread writes
+import datetime
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+
+import config
+from utils.metrics.metrics import Counter
+
+log_records_dropped = Counter(
+    "log_records_dropped_total", "Log records not written, by reason", ("reason",),
+)
+
+
+def parse_logger_settings(value):
+    """Parse ``"logger.name=1.5,other=2"`` into ``{"logger.name": 1.5, "other": 2.0}``."""
+    settings = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, number = item.partition("=")
+        settings[name.strip()] = float(number)
+    return settings
+
+
+def _lookup(settings, name):
+    # The most specific configured ancestor of a logger applies
+    while name:
+        if name in settings:
+            return name, settings[name]
+        name = name.rpartition(".")[0]
+    return None, None
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a configured fraction of sub-WARNING records per logger."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        _, rate = _lookup(self.rates, record.name)
+        if rate is None or random.random() < rate:
+            return True
+        log_records_dropped.inc("sampled")
+        return False
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket per configured logger, allowing ``rate`` records per second."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._buckets = {}
+
+    def filter(self, record):
+        key, rate = _lookup(self.rates, record.name)
+        if rate is None:
+            return True
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (rate, now))
+        tokens = min(rate, tokens + (now - updated) * rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            log_records_dropped.inc("rate_limited")
+            return False
+        self._buckets[key] = (tokens - 1, now)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; the message is only formatted here, in the worker."""
+
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class BoundedQueueHandler(logging.Handler):
+    """Enqueues records without formatting them; drops and counts them when the queue is full."""
+
+    def __init__(self, records):
+        super().__init__()
+        self.records = records
+
+    def emit(self, record):
+        try:
+            self.records.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc("queue_full")
+
+
+class LogWriter(threading.Thread):
+    """Drains the queue and writes records to ``stream`` in batches."""
+
+    _STOP = object()
+
+    def __init__(self, records, formatter, stream, batch_size=config.LOG_BATCH_SIZE):
+        super().__init__(name="log-writer", daemon=True)
+        self.records = records
+        self.formatter = formatter
+        self.stream = stream
+        self.batch_size = batch_size
+
+    def run(self):
+        while True:
+            batch = [self.records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(record is self._STOP for record in batch)
+            lines = []
+            for record in batch:
+                if record is self._STOP:
+                    continue
+                try:
+                    lines.append(self.formatter.format(record))
+                except Exception:
+                    log_records_dropped.inc("format_error")
+            if lines:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            if stop:
+                return
+
+    def stop(self, timeout=5):
+        # Blocks briefly if the queue is full so pending records are flushed first
+        self.records.put(self._STOP)
+        self.join(timeout)
+
+
+_writer = None
+
+
+def configure_logging():
+    """Route the root logger through the bounded queue and start the writer thread."""
+    global _writer
+    if _writer is not None:
+        return
+    records = queue.Queue(maxsize=config.LOG_QUEUE_SIZE)
+    handler = BoundedQueueHandler(records)
+    handler.addFilter(SamplingFilter(parse_logger_settings(config.LOG_SAMPLE_RATES)))
+    handler.addFilter(RateLimitFilter(parse_logger_settings(config.LOG_RATE_LIMITS)))
+
+    if config.LOG_FORMAT == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+    stream = open(config.LOG_FILE, "a", buffering=1 << 16) if config.LOG_FILE else sys.stderr
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(config.LOG_LEVEL)
+    _writer = LogWriter(records, formatter, stream)
+    _writer.start()
+
+
+def shutdown_logging():
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
@@ -1,19 +1,55 @@
 from functools import wraps
 import logging
+import random
+import reprlib
+import time
+
+import config
+from utils.metrics.metrics import function_duration, function_errors
 
 # Setup logger
 logger = logging.getLogger(__name__)
 
+# Size-bounded repr for captured arguments and results
+_repr = reprlib.Repr()
+_repr.maxstring = config.LOG_FUNCTION_MAX_CHARS
+_repr.maxother = config.LOG_FUNCTION_MAX_CHARS
+
+
+def _truncate(value):
+    text = _repr.repr(value)
+    if len(text) > config.LOG_FUNCTION_MAX_CHARS:
+        text = text[:config.LOG_FUNCTION_MAX_CHARS] + "..."
+    return text
+
+
 def log_function(func):
+    """Record latency and errors of ``func``.
+
+    Arguments and results are only logged when ``LOG_FUNCTION_CAPTURE`` is
+    enabled, for a ``LOG_FUNCTION_SAMPLE_RATE`` fraction of calls, and
+    truncated to ``LOG_FUNCTION_MAX_CHARS``.
+    """
+    name = func.__name__
+    # One logger per function so noisy functions can be sampled or rate limited on their own
+    func_logger = logger.getChild(name)
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        logger.info(f"Executing {func.__name__} with arguments: {args}, {kwargs}")
+        capture = config.LOG_FUNCTION_CAPTURE and random.random() < config.LOG_FUNCTION_SAMPLE_RATE
+        if capture:
+            func_logger.info("Executing %s with arguments: %s, %s", name, _truncate(args), _truncate(kwargs))
+        start = time.perf_counter()
         try:
             # Await the async function's result
             result = await func(*args, **kwargs)
-            logger.info(f"{func.__name__} completed successfully with result: {result}")
-            return result
         except Exception as e:
-            logger.error(f"Error in {func.__name__}: {e}")
+            function_errors.inc(name)
+            func_logger.error("Error in %s: %s", name, e)
             raise
-    return wrapper
\ No newline at end of file
+        finally:
+            function_duration.observe(time.perf_counter() - start, name)
+        if capture:
+            func_logger.info("%s completed successfully with result: %s", name, _truncate(result))
+        return result
+    return wrapper
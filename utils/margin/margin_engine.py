@@ -0,0 +1,102 @@
+# Batch margin engine: evaluates every margin account in a fixed number of queries
+import numpy as np
+
+import config
+from db_config import read_db
+from models import Client, Margin, Position
+from utils.margin.risk_model import margin_rates
+from utils.money.fixed_point import apply_rates_grouped, from_micros, to_micros
+from utils.yfinance.yfinance_stock_utils import fetch_latest_prices
+
+
+def compute_margin_batch(clients, positions, loans, prices, mmr=config.MMR, rates=None):
+    """Compute margin status for many accounts in one vectorized pass.
+
+    ``clients`` maps client id to name, ``positions`` is a list of
+    ``(client_id, symbol, quantity)`` tuples, ``loans`` maps client id to the
+    loan amount and ``prices`` maps symbol to its latest price, both in
+    micro-units, so every sum below is exact int64 arithmetic. ``rates``
+    optionally maps symbols to their own margin rate in micro-units; other
+    symbols use ``mmr``. Only clients with a margin account are evaluated.
+    Accounts holding a symbol without a known price are returned separately
+    instead of being valued at zero.
+    """
+    rates = rates or {}
+    mmr_micros = to_micros(mmr)
+    client_ids = [client_id for client_id in clients if client_id in loans]
+    index = {client_id: i for i, client_id in enumerate(client_ids)}
+
+    unpriced = {}
+    rows, quantities, position_prices, position_rates = [], [], [], []
+    for client_id, symbol, quantity in positions:
+        row = index.get(client_id)
+        if row is None:
+            continue
+        price = prices.get(symbol)
+        if price is None:
+            unpriced.setdefault(client_id, []).append(symbol)
+            continue
+        rows.append(row)
+        quantities.append(quantity or 0)
+        position_prices.append(price)
+        position_rates.append(rates.get(symbol, mmr_micros))
+
+    # np.bincount only sums float weights, so accumulate the int64 values with np.add.at
+    rows = np.asarray(rows, dtype=np.int64)
+    values = np.asarray(quantities, dtype=np.int64) * np.asarray(position_prices, dtype=np.int64)
+    portfolio_value = np.zeros(len(client_ids), dtype=np.int64)
+    np.add.at(portfolio_value, rows, values)
+    loan = np.asarray([loans[client_id] for client_id in client_ids], dtype=np.int64)
+    net_equity = portfolio_value - loan
+    margin_requirement = apply_rates_grouped(rows, values, position_rates, len(client_ids))
+    margin_shortfall = margin_requirement - net_equity
+
+    results = []
+    for i, client_id in enumerate(client_ids):
+        if client_id in unpriced:
+            continue
+        results.append({
+            "name": clients[client_id],
+            "portfolio_value": from_micros(int(portfolio_value[i])),
+            "loan_amount": from_micros(int(loan[i])),
+            "net_equity": from_micros(int(net_equity[i])),
+            "margin_requirement": from_micros(int(margin_requirement[i])),
+            "margin_shortfall": from_micros(int(margin_shortfall[i])),
+            "margin_call_triggered": bool(margin_shortfall[i] > 0),
+        })
+    # Margin calls first, largest shortfall at the top
+    results.sort(key=lambda r: (not r["margin_call_triggered"], -r["margin_shortfall"]))
+
+    unpriced_accounts = [
+        {"name": clients[client_id], "missing_symbols": sorted(set(symbols))}
+        for client_id, symbols in unpriced.items()
+    ]
+    return results, unpriced_accounts
+
+
+async def load_margin_batch(db=None):
+    """Load clients, positions, margin loans and latest prices with set-based queries on ``db``."""
+    clients = dict(await Client.all().using_db(db).values_list("id", "name"))
+    positions = await Position.all().using_db(db).values_list("client_id", "symbol", "quantity")
+
+    loans = {}
+    for client_id, loan in await Margin.all().using_db(db).order_by("id").values_list("client_id", "loan"):
+        # The single-account path uses the first margin row of a client
+        loans.setdefault(client_id, loan)
+
+    latest = await fetch_latest_prices({symbol for _, symbol, _ in positions}, db=db)
+    prices = {symbol: data["current_price"] for symbol, data in latest.items()}
+    as_of = max((data["timestamp"] for data in latest.values()), default=None)
+    return clients, positions, loans, prices, as_of
+
+
+async def get_all_margin_status(mmr=config.MMR):
+    """Margin status of every account, margin calls first."""
+    clients, positions, loans, prices, as_of = await load_margin_batch(read_db())
+    rates = await margin_rates.get()
+    accounts, unpriced_accounts = compute_margin_batch(clients, positions, loans, prices, mmr, rates)
+    return {
+        "timestamp": as_of,
+        "accounts": accounts,
+        "unpriced_accounts": unpriced_accounts,
+    }
@@ -0,0 +1,118 @@
+# Write-behind, append-only history of computed margin status
+import asyncio
+import datetime
+import logging
+
+import config
+from models import MarginSnapshot
+
+logger = logging.getLogger(__name__)
+
+
+class MarginHistoryWriter:
+    """Queues margin results in memory and appends them to ``MarginSnapshot`` in batches.
+
+    ``record`` never touches the database, so the read path that computes a
+    margin status does not pay for storing it. A background task flushes the
+    queue every ``flush_seconds``, or sooner once ``batch_size`` snapshots
+    are waiting, with one ``bulk_create`` per batch. A result identical to
+    the last one recorded for the same client is dropped, as is anything
+    recorded while ``max_pending`` snapshots are already queued. A batch
+    that fails to insert is logged and dropped.
+    """
+
+    def __init__(self, flush_seconds=config.MARGIN_HISTORY_FLUSH_SECONDS,
+                 batch_size=config.MARGIN_HISTORY_BATCH_SIZE, max_pending=config.MARGIN_HISTORY_QUEUE_SIZE):
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.recorded = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self._pending = []
+        self._last = {}  # client id -> (portfolio value, loan, requirement) last queued
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def record(self, client_id, portfolio_value, loan, margin_requirement, priced_at=None, timestamp=None):
+        """Queue one margin result in micro-units; returns False if it was dropped."""
+        if self.flush_seconds <= 0:
+            return False
+        state = (portfolio_value, loan, margin_requirement)
+        if self._last.get(client_id) == state:
+            self.duplicates += 1
+            return False
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._last[client_id] = state
+        self._pending.append(MarginSnapshot(
+            client_id=client_id,
+            portfolio_value=portfolio_value,
+            loan=loan,
+            margin_requirement=margin_requirement,
+            margin_call_triggered=margin_requirement > portfolio_value - loan,
+            priced_at=priced_at,
+            timestamp=timestamp or datetime.datetime.now(datetime.timezone.utc),
+        ))
+        self.recorded += 1
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    async def flush(self):
+        """Insert everything queued so far; returns the number of snapshots written."""
+        written = 0
+        while self._pending:
+            # Dequeued only once the insert finished, so a cancelled flush loses nothing
+            batch = self._pending[:self.batch_size]
+            try:
+                await MarginSnapshot.bulk_create(batch)
+            except Exception as e:
+                del self._pending[:len(batch)]
+                self.failed += len(batch)
+                # Let the next identical result through, since this one was never stored
+                for snapshot in batch:
+                    self._last.pop(snapshot.client_id, None)
+                logger.error("Error writing %s margin snapshots: %s", len(batch), e)
+                continue
+            del self._pending[:len(batch)]
+            written += len(batch)
+        self.written += written
+        return written
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "recorded": self.recorded,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self.flush_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Write what is still queued before the connections close
+        await self.flush()
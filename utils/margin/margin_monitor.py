@@ -0,0 +1,167 @@
+# Incremental margin monitoring driven by incoming price ticks
+import asyncio
+from collections import defaultdict
+import datetime
+import logging
+
+import config
+from utils.margin.margin_engine import load_margin_batch
+from utils.margin.risk_model import margin_rates
+from utils.money.fixed_point import from_micros, rate_products_to_micros, to_micros
+
+logger = logging.getLogger(__name__)
+
+
+class MarginMonitor:
+    """Keeps every margin account's portfolio value current as ticks arrive.
+
+    A symbol -> holders index built from ``Position`` limits each tick to
+    the accounts holding that symbol, whose value moves by
+    ``quantity * (new_price - old_price)``, and whose sum of
+    ``value * rate`` moves by that times the symbol's margin rate. Accounts
+    entering or leaving a margin call are published to every subscriber
+    queue. Values are integer micro-units, so incremental updates never
+    drift from a full valuation; a periodic full rebuild picks up position
+    and loan changes and the current risk-based rates. Ticks that arrive
+    while a rebuild is loading are buffered and replayed on top of the
+    loaded state, so the swap never rolls a price back.
+    """
+
+    def __init__(self, mmr=config.MMR, rebuild_seconds=config.MARGIN_MONITOR_REBUILD_SECONDS):
+        self.mmr = mmr
+        self.mmr_micros = to_micros(mmr)
+        self.rebuild_seconds = rebuild_seconds
+        self.accounts = {}
+        self.holders = defaultdict(dict)
+        self.prices = {}
+        self.rates = {}
+        self._subscribers = set()
+        self._tick_buffers = []  # One per rebuild in progress
+        self._task = None
+
+    async def rebuild(self):
+        buffer = []
+        self._tick_buffers.append(buffer)
+        try:
+            clients, positions, loans, prices, _ = await load_margin_batch()
+            rates = await margin_rates.get()
+        finally:
+            self._tick_buffers.remove(buffer)
+        accounts = {
+            client_id: {
+                "name": clients[client_id], "loan": loans[client_id], "value": 0, "rate_products": 0,
+                "unpriced": set(),
+            }
+            for client_id in clients if client_id in loans
+        }
+        holders = defaultdict(dict)
+        for client_id, symbol, quantity in positions:
+            account = accounts.get(client_id)
+            if account is None or not quantity:
+                continue
+            holders[symbol][client_id] = holders[symbol].get(client_id, 0) + quantity
+            if symbol in prices:
+                account["value"] += quantity * prices[symbol]
+                account["rate_products"] += quantity * prices[symbol] * rates.get(symbol, self.mmr_micros)
+            else:
+                account["unpriced"].add(symbol)
+
+        previous = self.accounts
+        self.accounts, self.holders, self.prices, self.rates = accounts, holders, dict(prices), rates
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for client_id, account in accounts.items():
+            account["margin_call"] = self._margin_call(account)
+            if client_id in previous:
+                self._publish_transition(previous[client_id].get("margin_call", False), account, now)
+        for ticks, timestamp in buffer:
+            self.on_ticks(ticks, timestamp)
+
+    def on_ticks(self, ticks, timestamp=None):
+        """Apply ``{symbol: price}`` ticks to the accounts holding those symbols."""
+        timestamp = timestamp or datetime.datetime.now(datetime.timezone.utc)
+        for buffer in self._tick_buffers:
+            buffer.append((ticks, timestamp))
+        touched = set()
+        for symbol, price in ticks.items():
+            price = int(price)
+            holders = self.holders.get(symbol)
+            old_price = self.prices.get(symbol)
+            self.prices[symbol] = price
+            if not holders:
+                continue
+            rate = self.rates.get(symbol, self.mmr_micros)
+            for client_id, quantity in holders.items():
+                account = self.accounts[client_id]
+                change = quantity * (price - (old_price or 0))
+                account["value"] += change
+                account["rate_products"] += change * rate
+                if old_price is None:
+                    account["unpriced"].discard(symbol)
+                touched.add(client_id)
+
+        for client_id in touched:
+            account = self.accounts[client_id]
+            was_margin_call = account.get("margin_call", False)
+            account["margin_call"] = self._margin_call(account)
+            self._publish_transition(was_margin_call, account, timestamp)
+
+    def status(self, account):
+        value = account["value"]
+        net_equity = value - account["loan"]
+        margin_requirement = rate_products_to_micros(account["rate_products"])
+        return {
+            "name": account["name"],
+            "portfolio_value": from_micros(value),
+            "loan_amount": from_micros(account["loan"]),
+            "net_equity": from_micros(net_equity),
+            "margin_requirement": from_micros(margin_requirement),
+            "margin_shortfall": from_micros(margin_requirement - net_equity),
+        }
+
+    def _margin_call(self, account):
+        if account["unpriced"]:
+            return False
+        return rate_products_to_micros(account["rate_products"]) > account["value"] - account["loan"]
+
+    def _publish_transition(self, was_margin_call, account, timestamp):
+        if account["margin_call"] == was_margin_call:
+            return
+        event = {
+            "type": "margin_call" if account["margin_call"] else "margin_call_cleared",
+            "timestamp": timestamp.isoformat(),
+            **self.status(account),
+        }
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                logger.warning("Dropping margin event for %s: subscriber queue full", account['name'])
+
+    def subscribe(self, max_size=config.MARGIN_EVENTS_QUEUE_SIZE):
+        queue = asyncio.Queue(maxsize=max_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error("Error rebuilding margin monitor: %s", e)
+            await asyncio.sleep(self.rebuild_seconds)
+
+    def start(self):
+        if self.rebuild_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,118 @@
+# Risk-based margin rates from the volatility or historical VaR of stored one-minute bars
+import asyncio
+import datetime
+import logging
+import math
+import time
+
+import numpy as np
+
+import config
+from db_config import read_db
+from models import PriceBar
+from utils.money.fixed_point import SCALE, to_micros
+
+logger = logging.getLogger(__name__)
+
+MARGIN_MODES = ("flat", "volatility", "var")
+
+
+def risk_rates(symbols, closes, mode, horizon_minutes=config.RISK_HORIZON_MINUTES,
+               multiplier=config.RISK_VOLATILITY_MULTIPLIER, confidence=config.RISK_VAR_CONFIDENCE,
+               min_bars=config.RISK_MIN_BARS):
+    """Per-symbol fraction of value at risk over the horizon, from closes in time order per symbol.
+
+    ``symbols`` and ``closes`` are parallel sequences. Log returns between
+    consecutive closes of a symbol are grouped with ``np.bincount``:
+    ``volatility`` takes ``multiplier`` standard deviations, ``var`` the
+    historical loss quantile at ``confidence``, each scaled by the square
+    root of the horizon in minutes and turned back into a price fall.
+    Symbols with fewer than ``min_bars`` closes are left out.
+    """
+    names, inverse = np.unique(np.asarray(symbols, dtype=object).astype(str), return_inverse=True)
+    # A stable sort keeps each symbol's closes in time order
+    order = np.argsort(inverse, kind="stable")
+    groups = inverse[order]
+    log_closes = np.log(np.asarray(closes, dtype=np.float64)[order])
+
+    same_symbol = groups[1:] == groups[:-1]
+    returns = np.diff(log_closes)[same_symbol]
+    groups = groups[1:][same_symbol]
+    counts = np.bincount(groups, minlength=len(names))
+    valid = counts + 1 >= max(min_bars, 3)
+    n = np.maximum(counts, 1)
+
+    if mode == "volatility":
+        mean = np.bincount(groups, returns, len(names)) / n
+        variance = np.bincount(groups, (returns - mean[groups]) ** 2, len(names)) / np.maximum(counts - 1, 1)
+        loss = multiplier * np.sqrt(variance)
+    elif mode == "var":
+        # Sort returns within each symbol and pick the order statistic at the loss quantile
+        returns = returns[np.lexsort((returns, groups))]
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        k = np.maximum(np.ceil(counts * (1.0 - confidence)).astype(np.int64) - 1, 0)
+        index = np.minimum(starts + k, max(returns.size - 1, 0))
+        loss = -np.minimum(returns[index], 0.0) if returns.size else np.zeros(len(names))
+    else:
+        raise ValueError(f"Unknown margin mode: {mode}")
+
+    rates = -np.expm1(-loss * math.sqrt(horizon_minutes))
+    return dict(zip(names[valid].tolist(), rates[valid].tolist()))
+
+
+class MarginRates:
+    """Per-symbol maintenance margin rates in micro-units, cached per window.
+
+    ``flat`` mode has no per-symbol rates, so every position uses ``mmr``.
+    Otherwise the rates of every symbol with enough bars in the lookback
+    are computed at most once per ``window_minutes`` wall-clock window,
+    floored at ``mmr`` and capped at 100%. Callers look symbols up with
+    ``rate``, which falls back to ``mmr``.
+    """
+
+    def __init__(self, mode=config.MARGIN_MODE, mmr=config.MMR, window_minutes=config.RISK_WINDOW_MINUTES,
+                 lookback_days=config.RISK_LOOKBACK_DAYS):
+        if mode not in MARGIN_MODES:
+            raise ValueError(f"MARGIN_MODE must be one of {', '.join(MARGIN_MODES)}, not {mode!r}")
+        self.mode = mode
+        self.mmr_micros = to_micros(mmr)
+        self.window_seconds = window_minutes * 60
+        self.lookback_days = lookback_days
+        self._window = None
+        self._rates = {}
+        self._lock = asyncio.Lock()
+
+    async def _compute(self):
+        since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.lookback_days)
+        bars = await PriceBar.filter(timestamp__gte=since, close__gt=0).using_db(read_db()) \
+            .order_by("symbol", "timestamp").values_list("symbol", "close")
+        if not bars:
+            return {}
+        symbols, closes = zip(*bars)
+        rates = await asyncio.to_thread(risk_rates, symbols, closes, self.mode)
+        return {
+            symbol: min(max(math.ceil(rate * SCALE), self.mmr_micros), SCALE)
+            for symbol, rate in rates.items()
+        }
+
+    async def get(self):
+        """``{symbol: rate}`` for the current window; empty in flat mode."""
+        if self.mode == "flat":
+            return {}
+        window = int(time.time() // self.window_seconds)
+        if window != self._window:
+            async with self._lock:
+                if window != self._window:
+                    try:
+                        self._rates = await self._compute()
+                        self._window = window
+                    except Exception as e:
+                        # Keep the previous window's rates and retry on the next call
+                        logger.error("Error computing %s margin rates: %s", self.mode, e)
+        return self._rates
+
+    def rate(self, rates, symbol):
+        return rates.get(symbol, self.mmr_micros)
+
+
+margin_rates = MarginRates()
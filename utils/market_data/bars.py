@@ -0,0 +1,73 @@
+# One-minute OHLCV bars kept from every yfinance download
+from decimal import ROUND_UP, Decimal
+import math
+
+import config
+from models import PriceBar
+from utils.market_data.timeseries import bucket_start
+from utils.money.fixed_point import to_micros
+
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def quantize_price(price):
+    """A vendor float price as micro-units, rounded up to a tenth of a cent."""
+    return to_micros(Decimal(price).quantize(Decimal('0.001'), rounding=ROUND_UP))
+
+
+def bars_from_frame(frame):
+    """``(timestamp, open, high, low, close, volume)`` tuples from a yfinance OHLCV frame, oldest first."""
+    frame = frame.dropna(subset=["Open", "High", "Low", "Close"])
+    return [
+        (timestamp.to_pydatetime(), quantize_price(open_), quantize_price(high),
+         quantize_price(low), quantize_price(close), 0 if math.isnan(volume) else int(volume))
+        for timestamp, open_, high, low, close, volume in zip(
+            frame.index, frame["Open"], frame["High"], frame["Low"], frame["Close"], frame["Volume"],
+        )
+    ]
+
+
+class PriceBarWriter:
+    """Deduplicated bulk upserts of one-minute bars into ``PriceBar``.
+
+    Every download returns the whole trading day, so the writer remembers
+    the newest bar it stored per symbol and skips anything older. The bar at
+    that watermark is written again because it may have still been forming.
+    Rows are keyed on ``(symbol, timestamp)`` and sent as
+    ``INSERT ... ON CONFLICT DO UPDATE`` batches, which also absorbs bars
+    already written by another worker.
+    """
+
+    def __init__(self, batch_size=config.PRICE_BARS_UPSERT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._watermarks = {}
+
+    async def upsert(self, bars_by_symbol):
+        """Store ``{symbol: bars}`` and return the number of rows written."""
+        rows = {}
+        for symbol, bars in bars_by_symbol.items():
+            watermark = self._watermarks.get(symbol)
+            for timestamp, open_, high, low, close, volume in bars:
+                timestamp = bucket_start(timestamp, "1m")
+                if watermark is not None and timestamp < watermark:
+                    continue
+                # A batch may not touch the same row twice, so the last copy of a bar wins
+                rows[(symbol, timestamp)] = PriceBar(
+                    symbol=symbol, timestamp=timestamp,
+                    open=open_, high=high, low=low, close=close, volume=volume,
+                )
+        if not rows:
+            return 0
+
+        bars = list(rows.values())
+        for i in range(0, len(bars), self.batch_size):
+            await PriceBar.bulk_create(
+                bars[i:i + self.batch_size], on_conflict=("symbol", "timestamp"), update_fields=BAR_FIELDS,
+            )
+        for symbol, timestamp in rows:
+            if symbol not in self._watermarks or timestamp > self._watermarks[symbol]:
+                self._watermarks[symbol] = timestamp
+        return len(rows)
+
+
+price_bar_writer = PriceBarWriter()
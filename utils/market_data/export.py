@@ -0,0 +1,87 @@
+# Keyset pagination and chunked export of stored MarketData ticks
+import base64
+import csv
+import datetime
+import io
+import json
+
+from fastapi import HTTPException
+from tortoise.expressions import Q
+
+import config
+from db_config import read_db
+from models import MarketData
+from utils.money.fixed_point import from_micros
+
+FIELDS = ("id", "symbol", "timestamp", "current_price")
+
+
+def encode_cursor(row):
+    raw = f"{row['timestamp'].isoformat()}|{row['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def market_data_query(symbol=None, start=None, end=None):
+    query = MarketData.all().using_db(read_db())
+    if symbol is not None:
+        query = query.filter(symbol=symbol)
+    if start is not None:
+        query = query.filter(timestamp__gte=start)
+    if end is not None:
+        query = query.filter(timestamp__lt=end)
+    return query
+
+
+async def fetch_page(query, after=None, limit=config.STOCKS_PAGE_SIZE):
+    """Return up to ``limit`` rows ordered by ``(timestamp, id)`` after the ``after`` key, priced in dollars."""
+    if after is not None:
+        timestamp, row_id = after
+        # The redundant lower bound lets the (timestamp, id) index seek to the cursor instead of scanning up to it
+        query = query.filter(Q(timestamp__gte=timestamp), Q(timestamp__gt=timestamp) | Q(id__gt=row_id))
+    rows = await query.order_by("timestamp", "id").limit(limit).values(*FIELDS)
+    for row in rows:
+        row["current_price"] = from_micros(row["current_price"])
+    return rows
+
+
+async def iter_chunks(query, chunk_size=config.STOCKS_EXPORT_CHUNK_SIZE):
+    """Yield the rows of ``query`` in chunks, holding at most one chunk in memory."""
+    after = None
+    while True:
+        rows = await fetch_page(query, after, chunk_size)
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1]["timestamp"], rows[-1]["id"])
+
+
+def _serializable(row):
+    return {**row, "timestamp": row["timestamp"].isoformat()}
+
+
+async def stream_ndjson(query):
+    async for rows in iter_chunks(query):
+        yield "".join(json.dumps(_serializable(row)) + "\n" for row in rows)
+
+
+async def stream_csv(query):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDS)
+    writer.writeheader()
+    async for rows in iter_chunks(query):
+        writer.writerows(_serializable(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,190 @@
+# Time-series maintenance for MarketData and PriceBar: OHLC rollups and retention
+import asyncio
+import datetime
+import logging
+
+from tortoise.expressions import Q
+from tortoise.functions import Max
+from tortoise.transactions import in_transaction
+
+import config
+from models import MarketData, MarketDataRollup, PriceBar
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_INTERVALS = ("1m", "1d")
+
+
+def _as_utc(timestamp):
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp.astimezone(datetime.timezone.utc)
+
+
+def bucket_start(timestamp, interval):
+    """Start of the rollup bucket containing ``timestamp``."""
+    timestamp = _as_utc(timestamp)
+    if interval == "1m":
+        return timestamp.replace(second=0, microsecond=0)
+    if interval == "1d":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup interval: {interval}")
+
+
+def _merge_tick(bar, timestamp, price):
+    bar.high = max(bar.high, price)
+    bar.low = min(bar.low, price)
+    bar.tick_count += 1
+    if timestamp < bar.first_tick_at:
+        bar.first_tick_at, bar.open = timestamp, price
+    if timestamp >= bar.last_tick_at:
+        bar.last_tick_at, bar.close = timestamp, price
+
+
+ROLLUP_COLUMNS = (
+    "symbol", "interval", "bucket", "open", "high", "low", "close", "tick_count", "first_tick_at", "last_tick_at",
+)
+# Ten parameters a row keeps every statement under SQLite's default limit of 999
+ROLLUP_UPSERT_ROWS = 90
+
+
+def _rollup_upsert_sql(dialect, rows):
+    """Multi-row INSERT that merges each bar into an existing one in the database itself."""
+    width = len(ROLLUP_COLUMNS)
+    if dialect == "postgres":
+        greatest, least = "GREATEST", "LEAST"
+        values = ", ".join(
+            "(" + ", ".join(f"${row * width + i}" for i in range(1, width + 1)) + ")" for row in range(rows)
+        )
+    else:
+        # SQLite's multi-argument MAX and MIN are scalar functions
+        greatest, least = "MAX", "MIN"
+        values = ", ".join(["(" + ", ".join("?" * width) + ")"] * rows)
+    t = '"marketdatarollup"'
+    columns = ", ".join(f'"{column}"' for column in ROLLUP_COLUMNS)
+    return (
+        f'INSERT INTO {t} ({columns}) VALUES {values} '
+        'ON CONFLICT ("symbol", "interval", "bucket") DO UPDATE SET '
+        f'"open" = CASE WHEN EXCLUDED."first_tick_at" < {t}."first_tick_at" THEN EXCLUDED."open" ELSE {t}."open" END, '
+        f'"close" = CASE WHEN EXCLUDED."last_tick_at" >= {t}."last_tick_at" THEN EXCLUDED."close" ELSE {t}."close" END, '
+        f'"high" = {greatest}({t}."high", EXCLUDED."high"), '
+        f'"low" = {least}({t}."low", EXCLUDED."low"), '
+        f'"tick_count" = {t}."tick_count" + EXCLUDED."tick_count", '
+        f'"first_tick_at" = {least}({t}."first_tick_at", EXCLUDED."first_tick_at"), '
+        f'"last_tick_at" = {greatest}({t}."last_tick_at", EXCLUDED."last_tick_at")'
+    )
+
+
+async def update_rollups(ticks):
+    """Fold ``(symbol, timestamp, price)`` ticks into the 1m and 1d OHLC rollups.
+
+    Ticks are first merged per bucket in memory, then each bucket is
+    upserted with ``INSERT ... ON CONFLICT DO UPDATE``, which merges it into
+    the stored bar in one statement: the highest high, the lowest low,
+    summed tick counts and the open and close of the earliest and latest
+    tick. Concurrent writers, in this or another worker, therefore never
+    lose or overwrite each other's ticks. Rows are sent in key order so
+    overlapping transactions lock them in the same order.
+    """
+    ticks = [(symbol, _as_utc(timestamp), int(price)) for symbol, timestamp, price in ticks]
+    if not ticks:
+        return
+
+    bars = {}
+    for interval in ROLLUP_INTERVALS:
+        for symbol, timestamp, price in ticks:
+            key = (symbol, interval, bucket_start(timestamp, interval))
+            bar = bars.get(key)
+            if bar is None:
+                bar = bars[key] = MarketDataRollup(
+                    symbol=symbol, interval=interval, bucket=key[2],
+                    open=price, high=price, low=price, close=price,
+                    tick_count=0, first_tick_at=timestamp, last_tick_at=timestamp,
+                )
+            _merge_tick(bar, timestamp, price)
+    rows = [
+        [getattr(bar, column) for column in ROLLUP_COLUMNS]
+        for _, bar in sorted(bars.items(), key=lambda item: item[0])
+    ]
+
+    async with in_transaction("default") as connection:
+        dialect = connection.capabilities.dialect
+        for i in range(0, len(rows), ROLLUP_UPSERT_ROWS):
+            chunk = rows[i:i + ROLLUP_UPSERT_ROWS]
+            await connection.execute_query(
+                _rollup_upsert_sql(dialect, len(chunk)), [value for row in chunk for value in row],
+            )
+
+
+async def _delete_in_batches(queryset, batch_size):
+    deleted = 0
+    while True:
+        ids = await queryset.order_by("id").limit(batch_size).values_list("id", flat=True)
+        if not ids:
+            return deleted
+        deleted += await queryset.model.filter(id__in=ids).delete()
+
+
+async def prune_market_data(retention_days=config.MARKET_DATA_RETENTION_DAYS,
+                            rollup_1m_retention_days=config.ROLLUP_1M_RETENTION_DAYS,
+                            price_bars_retention_days=config.PRICE_BARS_RETENTION_DAYS,
+                            batch_size=config.MARKET_DATA_PRUNE_BATCH_SIZE):
+    """Delete raw ticks, 1m rollups and price bars past their retention, in batches.
+
+    The latest tick of every symbol is always kept so latest-price lookups
+    keep working for symbols that stopped updating. Daily rollups are kept
+    indefinitely.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cutoff = now - datetime.timedelta(days=retention_days)
+
+    latest = await MarketData.annotate(latest=Max("timestamp")).group_by("symbol").values_list("symbol", "latest")
+    condition = Q(timestamp__lt=cutoff)
+    stale = [(symbol, ts) for symbol, ts in latest if _as_utc(ts) < cutoff]
+    if stale:
+        condition = Q(
+            Q(timestamp__lt=cutoff) & ~Q(symbol__in=[symbol for symbol, _ in stale]),
+            *[Q(symbol=symbol, timestamp__lt=ts) for symbol, ts in stale],
+            join_type=Q.OR,
+        )
+    ticks_deleted = await _delete_in_batches(MarketData.filter(condition), batch_size)
+
+    rollup_cutoff = now - datetime.timedelta(days=rollup_1m_retention_days)
+    rollups_deleted = await _delete_in_batches(
+        MarketDataRollup.filter(interval="1m", bucket__lt=rollup_cutoff), batch_size,
+    )
+
+    bars_cutoff = now - datetime.timedelta(days=price_bars_retention_days)
+    bars_deleted = await _delete_in_batches(PriceBar.filter(timestamp__lt=bars_cutoff), batch_size)
+    return ticks_deleted, rollups_deleted, bars_deleted
+
+
+class MarketDataRetention:
+    """Runs ``prune_market_data`` periodically in the background."""
+
+    def __init__(self, interval_seconds=config.MARKET_DATA_PRUNE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                ticks_deleted, rollups_deleted, bars_deleted = await prune_market_data()
+                logger.info("Pruned %s ticks, %s 1m rollups and %s price bars",
+                            ticks_deleted, rollups_deleted, bars_deleted)
+            except Exception as e:
+                logger.error("Error pruning market data: %s", e)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,80 @@
+# Request and database instrumentation feeding utils.metrics
+from contextvars import ContextVar
+from functools import wraps
+import time
+
+from tortoise.backends.base.client import BaseDBAsyncClient
+
+from utils.metrics.metrics import db_queries, http_request_db_queries, http_request_duration
+
+DB_METHODS = ("execute_insert", "execute_query", "execute_query_dict", "execute_many", "execute_script")
+
+# Per-request query counter; None outside a request
+_request_queries = ContextVar("request_queries", default=None)
+# Set while inside an instrumented call, so backend methods calling each other count once
+_in_db_call = ContextVar("in_db_call", default=False)
+
+
+def _subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        yield from _subclasses(subclass)
+
+
+def _count_queries(method):
+    @wraps(method)
+    async def wrapper(*args, **kwargs):
+        if _in_db_call.get():
+            return await method(*args, **kwargs)
+        db_queries.inc()
+        counter = _request_queries.get()
+        if counter is not None:
+            counter[0] += 1
+        token = _in_db_call.set(True)
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            _in_db_call.reset(token)
+    wrapper.__counts_queries__ = True
+    return wrapper
+
+
+def instrument_db_clients():
+    """Count queries on every loaded Tortoise backend; call after ``Tortoise.init``."""
+    for cls in _subclasses(BaseDBAsyncClient):
+        for name in DB_METHODS:
+            method = cls.__dict__.get(name)
+            if method is not None and not getattr(method, "__counts_queries__", False):
+                setattr(cls, name, _count_queries(method))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency and DB query count per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _request_queries.set(counter)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_queries.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label to keep cardinality bounded
+            path = route.path if route is not None else "unmatched"
+            http_request_duration.observe(elapsed, scope["method"], path, status[0])
+            http_request_db_queries.observe(counter[0], scope["method"], path)
@@ -0,0 +1,47 @@
+# Fixed-point money: amounts and prices are integers in micro-units (1e-6)
+from decimal import ROUND_HALF_EVEN, Decimal
+
+import numpy as np
+
+SCALE = 1_000_000
+_SCALE_DECIMAL = Decimal(SCALE)
+
+
+def to_micros(value):
+    """Convert a float, Decimal, int or numeric string to micro-units, rounding half to even."""
+    if isinstance(value, float):
+        # Go through the shortest repr so 0.1 becomes 100000, not 100000.00000000001
+        value = repr(value)
+    return int((Decimal(value) * _SCALE_DECIMAL).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def from_micros(micros):
+    """Micro-units as a float, for JSON responses."""
+    return micros / SCALE
+
+
+def rate_products_to_micros(products):
+    """A sum of ``amount * rate`` products, both in micro-units, as micro-units rounded up once."""
+    return -(-products // SCALE)
+
+
+def to_micros_array(values):
+    return np.rint(np.asarray(values, dtype=np.float64) * SCALE).astype(np.int64)
+
+
+def apply_rates_grouped(groups, amounts, rates, size):
+    """``rate_products_to_micros`` of each group's ``amount * rate`` sum, on int64 arrays.
+
+    ``groups`` holds each amount's group index in ``range(size)``. Each
+    product is split into whole and fractional units so it cannot overflow
+    int64 for any amount below about 9e12 units, and the fractional parts
+    are summed before the single rounding, so the result is exact.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    rates = np.asarray(rates, dtype=np.int64)
+    whole, fraction = np.divmod(-np.asarray(amounts, dtype=np.int64), SCALE)
+    whole_sum = np.zeros(size, dtype=np.int64)
+    fraction_sum = np.zeros(size, dtype=np.int64)
+    np.add.at(whole_sum, groups, whole * rates)
+    np.add.at(fraction_sum, groups, fraction * rates)
+    return -(whole_sum + fraction_sum // SCALE)
@@ -0,0 +1,108 @@
+# In-process cache of the latest stored price per symbol
+from collections import OrderedDict
+import time
+
+import config
+from utils.yfinance.shared_price_table import open_shared_price_table
+
+
+class LatestPriceCache:
+    """Symbol-keyed latest-price cache with a TTL and LRU eviction.
+
+    Entries are the same dicts ``fetch_latest_price`` returns. ``put`` only
+    replaces an entry with a tick that is at least as recent, so an older
+    row read from the database can never overwrite a fresher write-through.
+    Expired entries stay around until evicted so they can still be served
+    as stale prices when the upstream feed is failing.
+
+    With a ``shared`` table (see ``shared_price_table``) every put is also
+    published to the other worker processes, and lookups read the table
+    first, so a tick stored by any worker is served by all of them at once
+    and one database read or quote per symbol and TTL serves the whole host.
+    The private entries only answer for symbols the table cannot hold.
+    """
+
+    def __init__(self, ttl_seconds=config.PRICE_CACHE_TTL_SECONDS, max_size=config.PRICE_CACHE_MAX_SIZE,
+                 shared=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.shared = shared
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, symbol):
+        if self.shared is not None:
+            # Lock-free, and may hold a newer tick than this process has seen
+            row = self.shared.get(symbol, self.ttl_seconds)
+            if row is not None:
+                self.shared_hits += 1
+                return self._from_shared(symbol, row)
+        entry = self._entries.get(symbol)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl_seconds:
+            self._entries.move_to_end(symbol)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def get_stale(self, symbol):
+        """Return the last known entry even if its TTL has expired."""
+        if self.shared is not None:
+            row = self.shared.get(symbol)
+            if row is not None:
+                return self._from_shared(symbol, row)
+        entry = self._entries.get(symbol)
+        return entry[1] if entry is not None else None
+
+    def _from_shared(self, symbol, row):
+        price, timestamp, written_at = row
+        entry = self._entries.get(symbol)
+        if entry is not None and entry[1]["timestamp"] == timestamp and entry[1]["current_price"] == price:
+            # Same tick as the local copy, which callers may already hold
+            self._entries.move_to_end(symbol)
+            return entry[1]
+        # Age the local copy from when the tick was published, not from now
+        self._store(symbol, price, timestamp, time.monotonic() - max(0.0, time.time() - written_at))
+        return self._entries[symbol][1]
+
+    def put(self, symbol, current_price, timestamp):
+        entry = self._entries.get(symbol)
+        if entry is not None and entry[1]["timestamp"] > timestamp:
+            return
+        self._store(symbol, current_price, timestamp, time.monotonic())
+        if self.shared is not None:
+            self.shared.put(symbol, current_price, timestamp)
+
+    def _store(self, symbol, current_price, timestamp, stored_at):
+        self._entries[symbol] = (stored_at, {
+            "symbol": symbol,
+            "current_price": current_price,
+            "timestamp": timestamp,
+        })
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, symbol=None):
+        if symbol is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(symbol, None)
+
+    def stats(self):
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+        }
+
+
+price_cache = LatestPriceCache(shared=open_shared_price_table())
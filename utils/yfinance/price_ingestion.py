@@ -0,0 +1,152 @@
+# Background ingestion of latest prices for every held symbol
+import asyncio
+import logging
+import time
+
+from tortoise.functions import Max
+from tortoise.transactions import in_transaction
+
+import config
+from models import MarketData, Position
+from utils.metrics.metrics import yfinance_call_duration, yfinance_errors
+from utils.market_data.bars import bars_from_frame, price_bar_writer
+from utils.market_data.timeseries import update_rollups
+from utils.yfinance.price_cache import price_cache
+
+logger = logging.getLogger(__name__)
+
+# Serializes the stored-tick check and insert of every worker on Postgres
+INGESTION_LOCK_ID = 72_310_419
+
+
+async def store_ticks(ticks):
+    """Store ``{symbol: (timestamp, price)}`` ticks newer than the latest stored ones and roll them up.
+
+    The check reads the database, never the price cache, and runs in the
+    same transaction as the insert, behind an advisory lock on Postgres, so
+    a tick is stored once however many workers or requests see it. Returns
+    the ``MarketData`` rows inserted.
+    """
+    async with in_transaction("default") as connection:
+        if connection.capabilities.dialect == "postgres":
+            await connection.execute_query(f"SELECT pg_advisory_xact_lock({INGESTION_LOCK_ID})")
+        latest = dict(await MarketData.filter(symbol__in=list(ticks)).using_db(connection)
+                      .annotate(latest=Max("timestamp")).group_by("symbol").values_list("symbol", "latest"))
+        rows = [
+            MarketData(symbol=symbol, timestamp=timestamp, current_price=price)
+            for symbol, (timestamp, price) in ticks.items()
+            # Skip bars already stored, by this or another worker or e.g. outside market hours
+            if symbol not in latest or latest[symbol] < timestamp
+        ]
+        if rows:
+            await MarketData.bulk_create(rows, using_db=connection)
+            await update_rollups([(row.symbol, row.timestamp, row.current_price) for row in rows])
+    return rows
+
+
+class YFinancePriceSource:
+    """Pulls today's one-minute bars of many symbols in one multi-ticker download."""
+
+    def fetch(self, symbols):
+        # Imported on first use, see quote_fetcher.fetch_intraday_bars
+        import yfinance
+
+        data = yfinance.download(
+            tickers=list(symbols),
+            period="1d",
+            interval="1m",
+            auto_adjust=True,
+            group_by="column",
+            progress=False,
+            threads=True,
+        )
+        if data.empty:
+            return {}
+        bars = {}
+        for symbol in symbols:
+            if symbol not in data["Close"]:
+                continue
+            # Columns are (field, ticker) pairs; select one ticker's OHLCV frame
+            symbol_bars = bars_from_frame(data.xs(symbol, axis=1, level=1))
+            if symbol_bars:
+                bars[symbol] = symbol_bars
+        return bars
+
+
+class PriceIngestionScheduler:
+    """Periodically stores a fresh tick for every symbol held in ``Position``.
+
+    ``source`` is any object with a blocking ``fetch(symbols)`` method that
+    returns ``{symbol: bars}``, each bar a
+    ``(timestamp, open, high, low, close, volume)`` tuple with prices in
+    micro-units, oldest first; it runs in a worker thread so the download
+    never blocks the event loop. The last close becomes the symbol's tick
+    and every bar is kept in ``PriceBar``.
+    Every worker runs a scheduler, so ticks go through ``store_ticks``:
+    each is stored and rolled up once, by whichever worker gets there first.
+    Each callable in ``listeners`` is called with ``{symbol: price}`` for the
+    ticks newer than the last ones this scheduler passed on, whoever stored
+    them.
+    """
+
+    def __init__(self, source, interval_seconds=config.PRICE_INGESTION_INTERVAL_SECONDS):
+        self.source = source
+        self.interval_seconds = interval_seconds
+        self.listeners = []
+        self._seen = {}  # symbol -> timestamp of the last tick passed to the listeners
+        self._task = None
+
+    async def ingest_once(self, symbols=None):
+        """Run one ingestion cycle and return the ``MarketData`` rows this worker stored."""
+        if symbols is None:
+            symbols = await Position.all().distinct().values_list("symbol", flat=True)
+        symbols = sorted(set(symbols))
+        if not symbols:
+            return []
+
+        start = time.perf_counter()
+        try:
+            bars = await asyncio.to_thread(self.source.fetch, symbols)
+        except Exception:
+            yfinance_errors.inc("batch_download")
+            raise
+        finally:
+            yfinance_call_duration.observe(time.perf_counter() - start, "batch_download")
+        await price_bar_writer.upsert(bars)
+
+        ticks = {symbol: (symbol_bars[-1][0], symbol_bars[-1][4]) for symbol, symbol_bars in bars.items()}
+        rows = await store_ticks(ticks)
+
+        fresh = {
+            symbol: (timestamp, price) for symbol, (timestamp, price) in ticks.items()
+            if symbol not in self._seen or self._seen[symbol] < timestamp
+        }
+        if fresh:
+            for symbol, (timestamp, price) in fresh.items():
+                self._seen[symbol] = timestamp
+                price_cache.put(symbol, price, timestamp)
+            for listener in self.listeners:
+                listener({symbol: price for symbol, (_, price) in fresh.items()})
+        return rows
+
+    async def _run(self):
+        while True:
+            try:
+                rows = await self.ingest_once()
+                logger.info("Ingested %s price ticks", len(rows))
+            except Exception as e:
+                logger.error("Error ingesting market data: %s", e)
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,127 @@
+# Non-blocking, single-flight live quote fetches from Yahoo Finance
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from fastapi import HTTPException
+
+import config
+from utils.market_data.bars import bars_from_frame
+from utils.metrics.metrics import yfinance_call_duration, yfinance_errors
+from utils.yfinance.price_cache import price_cache
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteNotFound(Exception):
+    """Raised by a quote source when the symbol has no recent bars."""
+
+
+def fetch_intraday_bars(symbol):
+    """Blocking fetch of today's one-minute bars of ``symbol``, priced in micro-units, oldest first."""
+    # Imported on first use: yfinance pulls in pandas, which workers that never quote should not pay for
+    from yfinance import Ticker
+
+    bars = bars_from_frame(Ticker(symbol).history(period="1d", interval="1m"))
+    if not bars:
+        raise QuoteNotFound(symbol)
+    return bars
+
+
+class QuoteFetcher:
+    """Runs blocking quote fetches on a bounded thread pool.
+
+    Concurrent requests for one symbol share a single in-flight fetch. Each
+    wait is bounded by ``timeout_seconds`` and repeated failures open a
+    per-symbol circuit breaker for ``reset_seconds``. While a symbol is
+    failing, the last known price from the price cache is served as stale.
+    ``fetch`` returns the symbol's bars as
+    ``(timestamp, open, high, low, close, volume)`` tuples, oldest first.
+    """
+
+    def __init__(self, fetch=fetch_intraday_bars,
+                 max_workers=config.YFINANCE_MAX_WORKERS,
+                 timeout_seconds=config.YFINANCE_TIMEOUT_SECONDS,
+                 failure_threshold=config.YFINANCE_BREAKER_FAILURES,
+                 reset_seconds=config.YFINANCE_BREAKER_RESET_SECONDS):
+        self.fetch = fetch
+        self.timeout_seconds = timeout_seconds
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="yfinance")
+        self._in_flight = {}
+        self._failures = {}
+        self._opened_at = {}
+
+    def _circuit_open(self, symbol):
+        opened_at = self._opened_at.get(symbol)
+        if opened_at is None:
+            return False
+        if time.monotonic() - opened_at >= self.reset_seconds:
+            # Half-open: let the next fetch through to probe the upstream
+            del self._opened_at[symbol]
+            return False
+        return True
+
+    def _record_failure(self, symbol):
+        failures = self._failures.get(symbol, 0) + 1
+        self._failures[symbol] = failures
+        if failures >= self.failure_threshold:
+            self._opened_at[symbol] = time.monotonic()
+
+    def _record_success(self, symbol):
+        self._failures.pop(symbol, None)
+        self._opened_at.pop(symbol, None)
+
+    def _start_fetch(self, symbol):
+        future = self._in_flight.get(symbol)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, self.fetch, symbol)
+            self._in_flight[symbol] = future
+            start = time.perf_counter()
+            future.add_done_callback(lambda done: self._finish_fetch(symbol, done, start))
+        return future
+
+    def _finish_fetch(self, symbol, future, start):
+        self._in_flight.pop(symbol, None)
+        yfinance_call_duration.observe(time.perf_counter() - start, "quote")
+        # Mark the outcome as retrieved even if every waiter already timed out
+        if not future.cancelled():
+            error = future.exception()
+            if error is not None and not isinstance(error, QuoteNotFound):
+                yfinance_errors.inc("quote")
+
+    def _stale(self, symbol, status_code, detail):
+        cached = price_cache.get_stale(symbol)
+        if cached is None:
+            raise HTTPException(status_code=status_code, detail=detail)
+        logger.warning("Serving stale price for %s: %s", symbol, detail)
+        return cached["timestamp"], cached["current_price"], True, []
+
+    async def get(self, symbol):
+        """Return ``(timestamp, current_price, stale, bars)`` for ``symbol``; stale quotes have no bars."""
+        if self._circuit_open(symbol):
+            return self._stale(symbol, 503, "Stock data source unavailable")
+
+        future = self._start_fetch(symbol)
+        try:
+            bars = await asyncio.wait_for(asyncio.shield(future), self.timeout_seconds)
+        except QuoteNotFound:
+            self._record_success(symbol)
+            raise HTTPException(status_code=404, detail="Stock data not available")
+        except asyncio.TimeoutError:
+            self._record_failure(symbol)
+            return self._stale(symbol, 504, "Timed out fetching stock data")
+        except Exception as e:
+            logger.error("Error fetching data for stock %s: %s", symbol, e)
+            self._record_failure(symbol)
+            return self._stale(symbol, 500, "Failed to fetch stock data")
+
+        self._record_success(symbol)
+        timestamp, _, _, _, current_price, _ = bars[-1]
+        return timestamp, current_price, False, bars
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,168 @@
+# Latest-price table in a memory-mapped file, shared by every worker process on a host
+import datetime
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+import config
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RSKPRC01"
+HEADER = struct.Struct("<8sII48x")          # magic, slot count, slot size; padded to 64 bytes
+SLOT = struct.Struct("<Q24sqqd8x")          # sequence, symbol, price (micros), tick time (us), written at; 64 bytes
+SEQUENCE = struct.Struct("<Q")
+EMPTY_SYMBOL = bytes(24)
+MAX_READ_RETRIES = 100
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _to_epoch_micros(timestamp):
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=datetime.timezone.utc)
+    return (timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+class SharedPriceTable:
+    """Fixed-layout ``symbol -> (price, timestamp)`` table in a shared memory mapping.
+
+    Symbols live in an open-addressing hash table of ``SLOT``-sized records
+    that are claimed once and never move, so each process remembers a
+    symbol's slot after the first probe. Every record carries a sequence
+    number used as a seqlock: writers make it odd, write the fields and make
+    it even again, and readers retry if it was odd or changed while they
+    read. Reads take no lock and unpack straight from the mapping. Writes
+    are rare and serialized with an exclusive file lock across processes
+    plus a thread lock within one, since POSIX record locks do not exclude
+    threads of the same process.
+    """
+
+    def __init__(self, path, slots=config.SHARED_PRICE_TABLE_SLOTS):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(self._fd).st_size
+                if size == 0:
+                    os.ftruncate(self._fd, HEADER.size + slots * SLOT.size)
+                    os.pwrite(self._fd, HEADER.pack(MAGIC, slots, SLOT.size), 0)
+                magic, self.slots, slot_size = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+                if magic != MAGIC or slot_size != SLOT.size or size not in (0, HEADER.size + self.slots * SLOT.size):
+                    raise ValueError(f"{path} is not a shared price table of this layout")
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+            self._buffer = mmap.mmap(self._fd, HEADER.size + self.slots * SLOT.size)
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._slot_index = {}
+        self._write_lock = threading.Lock()
+        self.full = False
+
+    def _offset(self, slot):
+        return HEADER.size + slot * SLOT.size
+
+    def _read(self, slot):
+        """Consistent snapshot of one record, or None if a writer kept it busy."""
+        offset = self._offset(slot)
+        for _ in range(MAX_READ_RETRIES):
+            sequence = SEQUENCE.unpack_from(self._buffer, offset)[0]
+            if sequence & 1:
+                continue
+            record = SLOT.unpack_from(self._buffer, offset)
+            # Valid only if no write started or finished while the fields were copied
+            if SEQUENCE.unpack_from(self._buffer, offset)[0] == sequence:
+                return record
+        return None
+
+    def _probe(self, key):
+        """Slot holding ``key``, or ``(None, first empty slot)`` when it is absent."""
+        start = zlib.crc32(key) % self.slots
+        for i in range(self.slots):
+            slot = (start + i) % self.slots
+            record = self._read(slot)
+            if record is None:
+                return None, None
+            if record[1] == key:
+                return slot, None
+            if record[1] == EMPTY_SYMBOL:
+                return None, slot
+        return None, None
+
+    def _find(self, symbol):
+        slot = self._slot_index.get(symbol)
+        if slot is None:
+            key = symbol.encode()
+            if len(key) > len(EMPTY_SYMBOL):
+                return None
+            slot, _ = self._probe(key.ljust(len(EMPTY_SYMBOL), b"\0"))
+            if slot is not None:
+                self._slot_index[symbol] = slot
+        return slot
+
+    def get(self, symbol, max_age=None):
+        """Return ``(price, timestamp, written_at)`` or None; ``max_age`` is in seconds."""
+        slot = self._find(symbol)
+        if slot is None:
+            return None
+        record = self._read(slot)
+        if record is None:
+            return None
+        _, _, price, tick_micros, written_at = record
+        if max_age is not None and time.time() - written_at > max_age:
+            return None
+        return price, EPOCH + datetime.timedelta(microseconds=tick_micros), written_at
+
+    def put(self, symbol, price, timestamp):
+        """Store a tick unless the table already holds a newer one for ``symbol``."""
+        key = symbol.encode()
+        if len(key) > len(EMPTY_SYMBOL):
+            return False
+        key = key.ljust(len(EMPTY_SYMBOL), b"\0")
+        tick_micros = _to_epoch_micros(timestamp)
+        with self._write_lock:
+            return self._put(symbol, key, int(price), tick_micros)
+
+    def _put(self, symbol, key, price, tick_micros):
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            slot = self._slot_index.get(symbol)
+            if slot is None:
+                slot, empty = self._probe(key)
+                if slot is None:
+                    if empty is None:
+                        self.full = True
+                        return False
+                    slot = empty
+                self._slot_index[symbol] = slot
+            offset = self._offset(slot)
+            sequence, stored_key, _, stored_micros, _ = SLOT.unpack_from(self._buffer, offset)
+            if stored_key == key and stored_micros > tick_micros:
+                return False
+            SEQUENCE.pack_into(self._buffer, offset, sequence + 1)
+            SLOT.pack_into(self._buffer, offset, sequence + 1, key, price, tick_micros, time.time())
+            SEQUENCE.pack_into(self._buffer, offset, sequence + 2)
+            return True
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def close(self):
+        self._buffer.close()
+        os.close(self._fd)
+
+
+def open_shared_price_table(path=config.SHARED_PRICE_TABLE_PATH):
+    """The shared table at ``path``, or None when it is disabled or cannot be opened."""
+    if not path:
+        return None
+    try:
+        return SharedPriceTable(path)
+    except (OSError, ValueError) as e:
+        logger.warning("Shared price table disabled: %s", e)
+        return None
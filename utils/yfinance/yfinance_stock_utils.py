@@ -1,25 +1,63 @@
 # Function to check if the stock symbol exists using Yahoo Finance API
 from fastapi import HTTPException
-from yfinance import Ticker
+from tortoise.functions import Max
 
 from models import MarketData
+from utils.yfinance.price_cache import price_cache
 from utils.logging.logging_decorator import log_function
 
 @log_function
-async def fetch_latest_price(symbol: str, db_model=MarketData):
-    """Fetch the latest stock price closest to the given timestamp."""
+async def fetch_latest_price(symbol: str, db_model=MarketData, db=None):
+    """Fetch the latest stock price, served from the price cache when it is fresh."""
+    cached = price_cache.get(symbol)
+    if cached is not None:
+        return cached
+
     try:
-        market_data = await db_model.filter(symbol=symbol) \
-            .order_by('timestamp') \
+        market_data = await db_model.filter(symbol=symbol).using_db(db) \
+            .order_by('-timestamp') \
             .first()
     except Exception as e:
         raise HTTPException(status_code=500, detail="Error fetching market data from the database")
     
     if market_data:
+        price_cache.put(market_data.symbol, market_data.current_price, market_data.timestamp)
         return {
             "symbol": market_data.symbol,
             "current_price": market_data.current_price,
             "timestamp": market_data.timestamp
         }
     else:
-        raise HTTPException(status_code=404, detail="No data found for the given symbol")
\ No newline at end of file
+        raise HTTPException(status_code=404, detail="No data found for the given symbol")
+
+
+async def fetch_latest_prices(symbols, db_model=MarketData, db=None):
+    """Fetch the latest price of many symbols, querying only the ones not cached."""
+    prices = {}
+    missing = []
+    for symbol in set(symbols):
+        cached = price_cache.get(symbol)
+        if cached is not None:
+            prices[symbol] = cached
+        else:
+            missing.append(symbol)
+    if not missing:
+        return prices
+
+    try:
+        latest = dict(await db_model.filter(symbol__in=missing).using_db(db)
+                      .annotate(latest=Max("timestamp"))
+                      .group_by("symbol")
+                      .values_list("symbol", "latest"))
+        if not latest:
+            return prices
+        rows = await db_model.filter(symbol__in=list(latest), timestamp__in=list(latest.values())).using_db(db) \
+            .values("symbol", "current_price", "timestamp")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail="Error fetching market data from the database")
+
+    for row in rows:
+        if row["timestamp"] == latest[row["symbol"]]:
+            price_cache.put(row["symbol"], row["current_price"], row["timestamp"])
+            prices[row["symbol"]] = row
+    return prices